@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Query plans and timings of hot lookups, without and with their indexes.
+
+Seeds a synthetic dataset into a scratch database, then runs each query
+before and after creating the indexes of the hot columns.
+
+Run from the project root: python benchmarks/indexes.py [scale]
+Set BENCH_DATABASE_URL to use another (empty!) database than SQLite.
+"""
+
+import os
+import sys
+import random
+import tempfile
+import statistics
+import datetime as dt
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from sqlalchemy import text  # noqa: E402
+from dribdat.app import init_app  # noqa: E402
+from dribdat.database import db  # noqa: E402
+from dribdat.settings import TestConfig  # noqa: E402
+from dribdat.user.models import (  # noqa: E402
+    User, Event, Project, Category, Activity,
+)
+
+# Indexes of the hot lookups, see migrations 7e2b9d4c1a86 and 3a6f0c8e5d21
+HOT_INDEXES = [
+    'ix_activities_project_timestamp',
+    'ix_activities_user_timestamp',
+    'ix_activities_name_action_id',
+    'ix_activities_project_name_user',
+    'ix_activities_user_name_timestamp',
+    'ix_categories_event_id',
+    'ix_events_is_current',
+    'ix_projects_event_hidden_progress',
+]
+
+ACTIVITY_NAMES = ['star', 'star', 'update', 'update', 'update', 'boost',
+                  'review', 'create']
+REPEAT = 50
+
+
+class BenchConfig(TestConfig):
+    """Scratch database for the benchmark."""
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'BENCH_DATABASE_URL',
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    SQLALCHEMY_ECHO = False
+
+
+def seed(scale):
+    """Insert a dataset, with bulk statements for speed."""
+    rnd = random.Random(42)
+    now = dt.datetime.utcnow()
+    n_events, n_users = 10 * scale, 500 * scale
+    n_projects, n_activities = 1000 * scale, 20000 * scale
+    db.session.execute(User.__table__.insert(), [{
+        'id': i, 'username': 'user%d' % i, 'email': 'user%d@bench' % i,
+        'active': True, 'created_at': now,
+    } for i in range(1, n_users + 1)])
+    db.session.execute(Event.__table__.insert(), [{
+        'id': i, 'name': 'Event %d' % i, 'is_current': i == n_events,
+        'starts_at': now - dt.timedelta(days=30 * i),
+        'ends_at': now - dt.timedelta(days=30 * i - 2),
+    } for i in range(1, n_events + 1)])
+    db.session.execute(Category.__table__.insert(), [{
+        'id': i, 'name': 'Category %d' % i, 'event_id': i % n_events + 1,
+    } for i in range(1, 5 * n_events + 1)])
+    db.session.execute(Project.__table__.insert(), [{
+        'id': i, 'name': 'Project %d' % i, 'event_id': i % n_events + 1,
+        'user_id': rnd.randint(1, n_users), 'is_hidden': i % 20 == 0,
+        'progress': rnd.choice([0, 5, 10, 20, 30, 50]),
+        'created_at': now, 'updated_at': now,
+    } for i in range(1, n_projects + 1)])
+    db.session.execute(Activity.__table__.insert(), [{
+        'name': rnd.choice(ACTIVITY_NAMES),
+        'action': rnd.choice([None, 'post', 'commit']),
+        'project_id': rnd.randint(1, n_projects),
+        'user_id': rnd.randint(1, n_users),
+        'timestamp': now - dt.timedelta(minutes=i),
+    } for i in range(n_activities)])
+    db.session.commit()
+    return n_users, n_projects
+
+
+def hot_queries(n_users, n_projects):
+    """The lookups to measure, each with random parameters."""
+    def pid():
+        return random.randint(1, n_projects)
+
+    def uid():
+        return random.randint(1, n_users)
+    return {
+        'IsProjectStarred': lambda: Activity.query.filter_by(
+            name='star', project_id=pid(), user_id=uid()),
+        'Project.get_team': lambda: Activity.query.filter_by(
+            project_id=pid(), name='star'),
+        'User.joined_projects': lambda: db.session.get(
+            User, uid()).joined_projects_query(),
+        'Project.latest_activity': lambda: Activity.query.filter_by(
+            project_id=pid()).order_by(Activity.timestamp.desc()).limit(5),
+        'Event.current': lambda: Event.query.filter_by(is_current=True),
+        'event projects': lambda: Project.query.filter_by(
+            event_id=random.randint(1, n_projects // 100),
+            is_hidden=False).filter(Project.progress > 0),
+        'Event.categories_for_event': lambda: Category.query.filter_by(
+            event_id=random.randint(1, n_projects // 100)),
+        'latest posts': lambda: Activity.query.filter_by(
+            name='review', action='post').order_by(
+            Activity.id.desc()).limit(10),
+    }
+
+
+def query_plan(query):
+    """Ask the database how it runs a query."""
+    dialect = db.session.get_bind().dialect
+    sql = str(query.statement.compile(
+        dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))
+        return '; '.join(r[-1] for r in rows)
+    rows = db.session.execute(text('EXPLAIN ' + sql))
+    return '; '.join(r[0].strip() for r in rows)
+
+
+def measure(queries):
+    """Time each query, returning its median in ms and its plan."""
+    results = {}
+    for name, make_query in queries.items():
+        timings = []
+        for i in range(REPEAT + 1):
+            # Rows rather than objects, to leave out the ORM overhead
+            query = make_query()
+            started = default_timer()
+            db.session.execute(query.statement).all()
+            timings.append((default_timer() - started) * 1000)
+        timings = timings[1:]  # warming up
+        results[name] = (statistics.median(timings), query_plan(query))
+    return results
+
+
+def set_indexes(create):
+    """Create or drop the indexes of the hot lookups."""
+    bind = db.session.get_bind()
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name in HOT_INDEXES:
+                if create:
+                    index.create(bind)
+                else:
+                    index.drop(bind)
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def run(scale):
+    """Seed a database, then compare the queries without and with indexes."""
+    app = init_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        set_indexes(False)
+        print("Seeding at scale %d..." % scale)
+        queries = hot_queries(*seed(scale))
+        before = measure(queries)
+        set_indexes(True)
+        after = measure(queries)
+        print("%-28s %10s %10s %8s" % (
+            'query', 'before ms', 'after ms', 'speedup'))
+        for name in queries:
+            b, a = before[name][0], after[name][0]
+            print("%-28s %10.3f %10.3f %7.1fx" % (
+                name, b, a, b / a if a else 0))
+        print()
+        for name in queries:
+            print("%s\n  before: %s\n  after:  %s" % (
+                name, before[name][1], after[name][1]))
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
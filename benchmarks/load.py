@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Latency and SQL query counts of the main pages and API endpoints.
+
+Generates a hackathon dataset with the test factories, then requests each
+endpoint through the Flask test client, and compares the results with a
+stored baseline, to catch performance regressions.
+
+Run from the project root: python benchmarks/load.py [--scale N]
+Use --save to write the results as the new baseline.
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import datetime as dt
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from sqlalchemy import event as sa_event  # noqa: E402
+from sqlalchemy.orm import configure_mappers  # noqa: E402
+from dribdat.app import init_app  # noqa: E402
+from dribdat.database import db  # noqa: E402
+from dribdat.settings import TestConfig  # noqa: E402
+from dribdat.user.models import Category  # noqa: E402
+from tests.factories import (  # noqa: E402
+    UserFactory, ProjectFactory, EventFactory, ActivityFactory,
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Per unit of scale
+EVENTS = 5
+USERS = 1000
+PROJECTS = 1000
+ACTIVITIES = 10000
+
+# Requests per endpoint, and the slowdown reported as a regression
+REPEAT = 20
+TOLERANCE = 1.25
+
+ACTIVITY_TYPES = [
+    ('star', None), ('star', None), ('update', 'commit'),
+    ('update', 'commit'), ('update', 'sync'), ('review', 'post'),
+    ('boost', None), ('create', None),
+]
+
+README = """## %s
+
+A project with **formatting**, a [link](https://example.com) and a list:
+
+- one item
+- another item
+
+```
+make install
+```
+"""
+
+
+class BenchConfig(TestConfig):
+    """Scratch database, and no cache, to measure the full requests."""
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'BENCH_DATABASE_URL',
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    SQLALCHEMY_ECHO = False
+    CACHE_TYPE = 'NullCache'
+    HTTP_CACHE = False
+
+
+def seed(scale):
+    """Create a dataset with the factories, returning sample ids."""
+    # Only flushed until the end, so that objects are not reloaded
+    rnd = random.Random(42)
+    now = dt.datetime.utcnow()
+    users = UserFactory.create_batch(USERS * scale)
+    events, categories = [], {}
+    for i in range(EVENTS * scale):
+        starts_at = now - dt.timedelta(days=60 * i)
+        evt = EventFactory(
+            starts_at=starts_at, ends_at=starts_at + dt.timedelta(days=2),
+            is_current=(i == 0))
+        events.append(evt)
+        categories[evt] = [
+            Category(name='Category %d' % c, event=evt,
+                     description='Challenges about *topic %d*.' % c)
+            for c in range(5)]
+        db.session.add_all(categories[evt])
+    projects = []
+    for i in range(PROJECTS * scale):
+        evt = events[i % len(events)]
+        projects.append(ProjectFactory(
+            event=evt, user=rnd.choice(users),
+            category=rnd.choice(categories[evt]),
+            progress=rnd.choice([0, 5, 10, 20, 30, 50]),
+            score=rnd.randint(0, 100), is_hidden=(i % 50 == 0),
+            longtext=README % i))
+    db.session.flush()
+    activities = {}
+    for i in range(ACTIVITIES * scale):
+        name, action = rnd.choice(ACTIVITY_TYPES)
+        project = rnd.choice(projects)
+        ActivityFactory(
+            name=name, action=action, project_id=project.id,
+            user_id=rnd.choice(users).id,
+            timestamp=now - dt.timedelta(minutes=i),
+            project_progress=project.progress,
+            content=None if action != 'post' else 'Progress %d' % i)
+        activities[project] = activities.get(project, 0) + 1
+    current = events[0]
+    busiest = max(projects[::len(events)], key=lambda p: activities.get(p, 0))
+    ids = (current.id, busiest.id)
+    db.session.commit()
+    return ids
+
+
+def endpoints(event_id, project_id):
+    """The URLs to request, by name."""
+    return {
+        'home': '/',
+        'event': '/event/%d' % event_id,
+        'project': '/project/%d' % project_id,
+        'dribs': '/dribs',
+        'projects.json': '/api/event/%d/projects.json' % event_id,
+        'projects.csv': '/api/event/%d/projects.csv' % event_id,
+        'datapackage': '/api/event/%d/datapackage.json' % event_id,
+    }
+
+
+class QueryCounter(object):
+    """Counts the statements sent to the database."""
+
+    def __init__(self, engine):
+        """Listen to the engine."""
+        self.count = 0
+        sa_event.listen(engine, 'before_cursor_execute', self.executed)
+
+    def executed(self, *args, **kwargs):
+        """Called before each statement."""
+        self.count += 1
+
+
+def percentile(timings, pct):
+    """Return a percentile of the timings."""
+    return statistics.quantiles(timings, n=100, method='inclusive')[pct - 1]
+
+
+def measure(app, urls, repeat):
+    """Request each URL, returning latency percentiles and query counts."""
+    client = app.test_client()
+    counter = QueryCounter(db.engine)
+    results = {}
+    for name, url in urls.items():
+        client.get(url).get_data()  # warm up the templates
+        timings, queries = [], []
+        for i in range(repeat):
+            # Requests share our app context, so start each with a new
+            # session, as they would in the server
+            db.session.remove()
+            counter.count = 0
+            started = default_timer()
+            response = client.get(url)
+            response.get_data()  # consume streamed responses
+            timings.append((default_timer() - started) * 1000)
+            queries.append(counter.count)
+            if response.status_code != 200:
+                raise Exception("%s returned %d" % (
+                    url, response.status_code))
+        results[name] = {
+            'p50': round(percentile(timings, 50), 3),
+            'p90': round(percentile(timings, 90), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+            'bytes': len(response.get_data()),
+        }
+    return results
+
+
+def compare(results, baseline):
+    """Print the results, next to the baseline if there is one."""
+    base = baseline['results'] if baseline else {}
+    print("%-14s %9s %9s %9s %8s %9s %8s" % (
+        'endpoint', 'p50 ms', 'p90 ms', 'p99 ms', 'queries',
+        'base p50', 'change'))
+    regressions = []
+    for name, r in results.items():
+        b = base.get(name)
+        if b is None:
+            print("%-14s %9.1f %9.1f %9.1f %8d %9s %8s" % (
+                name, r['p50'], r['p90'], r['p99'], r['queries'], '-', ''))
+            continue
+        change = r['p50'] / b['p50'] if b['p50'] else 1
+        print("%-14s %9.1f %9.1f %9.1f %8d %9.1f %7.2fx" % (
+            name, r['p50'], r['p90'], r['p99'], r['queries'],
+            b['p50'], change))
+        if change > TOLERANCE:
+            regressions.append("%s is %.2fx slower" % (name, change))
+        if r['queries'] > b['queries']:
+            regressions.append("%s makes %d queries instead of %d" % (
+                name, r['queries'], b['queries']))
+    for regression in regressions:
+        print("Regression: %s" % regression)
+    return regressions
+
+
+def run(scale, repeat, save):
+    """Seed a database, then benchmark the endpoints."""
+    app = init_app(BenchConfig)
+    with app.app_context():
+        configure_mappers()  # explicit for Continuum
+        db.create_all()
+        print("Seeding at scale %d..." % scale)
+        started = default_timer()
+        urls = endpoints(*seed(scale))
+        print("Seeded in %.1fs, measuring %d requests per endpoint" % (
+            default_timer() - started, repeat))
+        results = measure(app, urls, repeat)
+        database = db.engine.dialect.name
+        db.session.remove()
+        db.drop_all()
+    baseline = None
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as fp:
+            baseline = json.load(fp)
+        if baseline['scale'] != scale:
+            print("Baseline is at scale %d, not comparing" % baseline['scale'])
+            baseline = None
+    regressions = compare(results, baseline)
+    if save:
+        with open(BASELINE, 'w') as fp:
+            json.dump({
+                'scale': scale,
+                'repeat': repeat,
+                'python': platform.python_version(),
+                'database': database,
+                'date': dt.date.today().isoformat(),
+                'results': results,
+            }, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+        print("Baseline saved to %s" % BASELINE)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1,
+                        help="size of the dataset")
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help="requests per endpoint")
+    parser.add_argument('--save', action='store_true',
+                        help="store the results as the baseline")
+    args = parser.parse_args()
+    regressions = run(args.scale, args.repeat, args.save)
+    sys.exit(1 if regressions and not args.save else 0)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the Onebox engine on documents of different sizes.
+
+Run from the project root: python benchmarks/onebox.py [repeat]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from flask import url_for  # noqa: E402
+from micawber.providers import ProviderRegistry  # noqa: E402
+from dribdat.app import init_app  # noqa: E402
+from dribdat.database import db  # noqa: E402
+from dribdat.onebox import OneboxEngine  # noqa: E402
+from dribdat.settings import TestConfig  # noqa: E402
+
+
+def sample_documents(home_url):
+    """A category description, a project pitch, and a long README."""
+    short = '\n'.join([
+        'Projects on **open data** about energy.',
+        'https://opendata.swiss/de/dataset/energy-dashboard',
+    ])
+    pitch = []
+    for i in range(10):
+        pitch += [
+            '## Part %d' % i,
+            'Some text, with [a link](https://example.com/%d) inside.' % i,
+            '',
+            '%sproject/%d' % (home_url, 100000 + i),
+            'https://example.com/slides/%d' % i,
+        ]
+    readme = []
+    for i in range(200):
+        readme += [
+            '### Step %d' % i,
+            'Run `make step-%d`, as described in the docs.' % i,
+            'https://example.com/docs/%d' % i,
+        ]
+    return {
+        'category': short,
+        'pitch': '\n'.join(pitch),
+        'readme': '\n'.join(readme),
+    }
+
+
+def run(repeat):
+    """Time the renderer on each of the documents."""
+    app = init_app(TestConfig)
+    with app.test_request_context():
+        db.create_all()
+        # No remote providers, so that only the parsing is measured
+        engine = OneboxEngine(ProviderRegistry())
+        docs = sample_documents(url_for('public.home', _external=True))
+        print("%-10s %8s %12s %14s" % (
+            'document', 'lines', 'render (ms)', 'per line (us)'))
+        for name, text in docs.items():
+            single = min(timeit.repeat(
+                lambda: engine.render(text),
+                number=repeat, repeat=3)) / repeat
+            lines = len(text.splitlines())
+            print("%-10s %8d %12.3f %14.2f" % (
+                name, lines, single * 1000, single * 1e6 / lines))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -175,6 +175,38 @@ def cleanup(deleteusers=True):
         print('%d user accounts cleaned up' % delcount)
 
 
+@click.command()
+@click.argument('event', required=False)
+def counters(event=None):
+    """Recalculate activity counters of projects, optionally by EVENT ID."""
+    with create_app().app_context():
+        from dribdat.aggregation import RefreshProjectCounters
+        count = RefreshProjectCounters(event)
+        print("Refreshed counters of %d projects." % count)
+
+
+@click.command()
+@click.argument('event', required=True)
+def rescore(event):
+    """Recalculate the scores of all projects in an EVENT ID."""
+    with create_app().app_context():
+        from dribdat.aggregation import RescoreEventProjects
+        event = Event.query.filter_by(id=event).first_or_404()
+        count = RescoreEventProjects(event.id)
+        print("Updated scores of %d projects in: %s" % (count, event.name))
+
+
+@click.command()
+@click.option('--once', is_flag=True, help="Exit when the queue is empty.")
+@click.option('--interval', default=5, help="Seconds between queue checks.")
+def worker(once, interval):
+    """Run queued background jobs."""
+    with create_app().app_context():
+        from dribdat.jobs import work
+        count = work(once, interval)
+        print("Processed %d jobs." % count)
+
+
 @click.group(name='j')
 def cli():
     """dribdat command line interfoot."""
@@ -187,6 +219,9 @@ cli.add_command(register)
 cli.add_command(imports)
 cli.add_command(exports)
 cli.add_command(cleanup)
+cli.add_command(counters)
+cli.add_command(rescore)
+cli.add_command(worker)
 
 if __name__ == '__main__':
     cli()
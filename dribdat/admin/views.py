@@ -4,12 +4,17 @@ from flask import (
     Blueprint, render_template, redirect, url_for,
     request, flash, jsonify
 )
-from flask_login import login_required
+from flask_login import login_required, current_user
 
 from ..utils import sanitize_input
 from ..extensions import db, cache
 from ..decorators import admin_required
-from ..aggregation import GetProjectData, SyncProjectData
+from ..jobs import enqueue
+from ..apicache import cache_stats
+from ..apiclient import host_stats
+from ..aggregation import (
+    GetProjectData, RescoreEventProjects
+)
 from ..user.models import Role, User, Event, Project, Category, Resource
 from .forms import (
     RoleForm,
@@ -58,6 +63,14 @@ def index():
                            stats=stats, default_event=event, active='index')
 
 
+@blueprint.route('/remote')
+@login_required
+@admin_required
+def remote():
+    return render_template('admin/remote.html', hosts=host_stats(),
+                           httpcache=cache_stats(), active='index')
+
+
 @blueprint.route('/users')
 @blueprint.route('/users/pp/<int:page>')
 @login_required
@@ -354,17 +367,33 @@ def event_delete(event_id):
 @admin_required
 def event_autosync(event_id):
     event = Event.query.filter_by(id=event_id).first_or_404()
-    count = 0
-    for project in event.projects:
-        if not project.is_autoupdateable:
-            continue
-        data = GetProjectData(project.autotext_url)
-        if 'name' not in data:
-            flash("Could not sync: %s" % project.name, 'warning')
-            continue
-        SyncProjectData(project, data)
-        count += 1
-    flash("%d projects synced." % count, 'success')
+    job = enqueue('event_autosync', current_user, event_id=event.id)
+    if job.status == 'failed':
+        flash("Could not sync: %s" % job.error, 'warning')
+        return event_projects(event.id)
+    elif job.status != 'done':
+        flash("Sync has been scheduled (job %d)." % job.id, 'info')
+        return event_projects(event.id)
+    report = job.data['result']['report']
+    for result in report:
+        if result['status'] == 'failed':
+            flash("Could not sync: %s (%s)" % (
+                result['name'], result['error']), 'warning')
+    synced = [r for r in report if r['status'] == 'synced']
+    unchanged = [r for r in report if r['status'] == 'unchanged']
+    flash("%d projects synced, %d unchanged." % (
+        len(synced), len(unchanged)), 'success')
+    return event_projects(event.id)
+
+
+@blueprint.route('/event/<int:event_id>/rescore', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def event_rescore(event_id):
+    event = Event.query.filter_by(id=event_id).first_or_404()
+    count = RescoreEventProjects(event.id)
+    cache.clear()
+    flash("%d project scores updated." % count, 'success')
     return event_projects(event.id)
 
 
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """Utilities for aggregating data."""
 
-from dribdat.user.models import Activity, User, Project
+from dribdat.user.models import Activity, User, Project, SCORE_CONTENT_RULES
+from dribdat.user.constants import PR_CHALLENGE
 from dribdat.user import isUserActive
 from dribdat.database import db
 from dribdat.apifetch import (
@@ -17,23 +18,42 @@ from dribdat.apifetch import (
 )
 import json
 import re
-from sqlalchemy import and_
+import time
+import pytz
+import datetime as dt
+import threading
+from itertools import islice
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import and_, or_, func, case, bindparam
 
 
-def GetProjectData(url):
+def GetProjectData(url, since=None, stream=False):
     """Parse the Readme URL to collect remote data."""
+    data = FetchRemoteData(url, since)
+    # Commits are paged in as they are read when streaming, else in full
+    # so that the data can be stored or serialized. Without a start time,
+    # as for previews, only the latest page of them is fetched.
+    if not stream and 'commits' in data:
+        data['commits'] = list(data['commits'])
+    return data
+
+
+def FetchRemoteData(url, since=None):
+    """Collect data from the kind of site of the URL."""
+    # Commits are only fetched from the "since" time, if given
     # TODO: find a better way to decide the kind of repo
     if url.find('//gitlab.com/') > 0:
-        return get_gitlab_project(url)
+        return get_gitlab_project(url, since)
 
     # TODO: add support for projects
     elif url.find('//github.com/') > 0 or url.find('//gist.github.com/') > 0:
-        return get_github_project(url)
+        return get_github_project(url, since)
 
     # TODO: there's a lot more Gitea out there!
     elif url.find('//codeberg.org/') > 0:
         # TODO: especially here..
-        return get_gitea_project(url)
+        return get_gitea_project(url, since)
 
     elif url.find('//bitbucket.org/') > 0:
         return get_bitbucket_project(url)
@@ -51,16 +71,16 @@ def GetProjectData(url):
         return FetchWebProject(url)
 
 
-def get_gitlab_project(url):
+def get_gitlab_project(url, since=None):
     apiurl = url
     apiurl = re.sub(r'(?i)-?/blob/[a-z]+/README.*', '', apiurl)
     apiurl = re.sub(r'https?://gitlab\.com/', '', apiurl).strip('/')
     if apiurl == url:
         return {}
-    return FetchGitlabProject(apiurl)
+    return FetchGitlabProject(apiurl, since)
 
 
-def get_github_project(url):
+def get_github_project(url, since=None):
     apiurl = url
     if apiurl.startswith('https://gist.github.com/'):
         # GitHub Gist
@@ -74,10 +94,10 @@ def get_github_project(url):
     if apiurl.endswith('.md'):
         # GitHub Markdown
         return FetchWebGitHub(url)
-    return FetchGithubProject(apiurl)
+    return FetchGithubProject(apiurl, since)
 
 
-def get_gitea_project(url):
+def get_gitea_project(url, since=None):
     apiurl = url
     apiurl = re.sub(r'(?i)/src/branch/[a-z]+/README.*', '', apiurl)
     apiurl = re.sub(r'https?://codeberg\.org/', '', apiurl).strip('/')
@@ -85,7 +105,7 @@ def get_gitea_project(url):
         apiurl = apiurl[:-4]
     if apiurl == url:
         return {}
-    return FetchGiteaProject(apiurl)
+    return FetchGiteaProject(apiurl, since)
 
 
 def get_bitbucket_project(url):
@@ -180,6 +200,78 @@ def AddProjectDataFromAutotext(project):
     """Fills the project from the configured remote URL."""
     data = GetProjectData(project.autotext_url)
     TrimProjectData(project, data)
+
+
+# Fields which SyncProjectData may change
+SYNC_FIELDS = [
+    'autotext', 'name', 'ident', 'hashtag', 'summary', 'image_url',
+    'source_url', 'webpage_url', 'contact_url', 'download_url',
+    'is_webembed', 'count_commits',
+]
+SYNC_WORKERS = 8    # total concurrent remote fetches
+SYNC_PER_HOST = 3   # concurrent fetches per remote host
+SYNC_BATCH = 100    # commits inserted per transaction
+
+
+def FetchProjectsData(urls, since=None,
+                      max_workers=SYNC_WORKERS, per_host=SYNC_PER_HOST):
+    """Fetch remote data of many URLs at once, yielding as they arrive."""
+    # Only plain data crosses the thread boundary, never ORM objects
+    since = since or {}
+    limits = {}
+    for url in urls.values():
+        host = urlparse(url).netloc.lower()
+        limits[host] = threading.BoundedSemaphore(per_host)
+
+    def fetch(url, since):
+        with limits[urlparse(url).netloc.lower()]:
+            started = time.monotonic()
+            try:
+                data, error = GetProjectData(url, since), None
+            except Exception as ex:  # noqa: B902
+                data, error = {}, str(ex)
+            return data, error, time.monotonic() - started
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch, url, since.get(key)): key
+                   for key, url in urls.items()}
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
+
+
+def SyncEventProjects(projects, max_workers=SYNC_WORKERS,
+                      per_host=SYNC_PER_HOST):
+    """Sync all autoupdateable projects, returning a report per project."""
+    projects = {p.id: p for p in projects if p.is_autoupdateable}
+    urls = {pid: p.autotext_url.strip() for pid, p in projects.items()}
+    since = {pid: p.commits_since for pid, p in projects.items()}
+    report = []
+    fetched = FetchProjectsData(urls, since, max_workers, per_host)
+    # Database writes happen one at a time, in this thread's session
+    for pid, data, error, elapsed in fetched:
+        project = projects[pid]
+        result = {'id': pid, 'name': project.name}
+        started = time.monotonic()
+        if 'name' not in data:
+            result['status'] = 'failed'
+            result['error'] = error or 'No data'
+        else:
+            before = [getattr(project, f) for f in SYNC_FIELDS]
+            try:
+                SyncProjectData(project, data)
+            except Exception as ex:  # noqa: B902
+                db.session.rollback()
+                result['status'] = 'failed'
+                result['error'] = str(ex)
+            else:
+                after = [getattr(project, f) for f in SYNC_FIELDS]
+                result['status'] = 'synced' if before != after \
+                    else 'unchanged'
+        result['fetch_time'] = round(elapsed, 3)
+        result['sync_time'] = round(time.monotonic() - started, 3)
+        report.append(result)
+    report.sort(key=lambda r: r['id'])
+    return report
     
 
 def IsProjectStarred(project, current_user):
@@ -227,23 +319,23 @@ def ProjectsByProgress(progress=None, event=None):
     return projects.order_by(Project.category_id).all()
 
 
+def QueryEventUsers(event):
+    """Query the users that have a project in this event, by name."""
+    # TODO: how about actual membership?
+    projects = db.session.query(Project.id).filter_by(event_id=event.id)
+    starred = db.session.query(Activity.user_id).filter(and_(
+        Activity.name == 'star',
+        Activity.project_id.in_(projects)
+    ))
+    return User.query.filter(User.id.in_(starred)) \
+        .order_by(User.username)
+
+
 def GetEventUsers(event):
     """Fetch all users that have a project in this event."""
     if not event.projects:
         return None
-    users = []
-    userlist = []
-    projects = set([p.id for p in event.projects])
-    # TODO: slow; how about actual membership?
-    activities = Activity.query.filter(and_(
-            Activity.name=='star', 
-            Activity.project_id.in_(projects)
-        )).all()
-    for a in activities:
-        if a.user and a.user_id not in userlist:
-            userlist.append(a.user_id)
-            users.append(a.user)
-    return sorted(users, key=lambda x: x.username)
+    return QueryEventUsers(event).all()
 
 
 def ProjectActivity(project, of_type, user, action=None, comments=None):
@@ -278,12 +370,80 @@ def ProjectActivity(project, of_type, user, action=None, comments=None):
     return True
 
 
+def RefreshProjectCounters(event_id=None):
+    """Recalculate the activity counters of projects from scratch."""
+    # Required after bulk updates or deletes of activities, which do not
+    # go through the listeners that maintain the counters
+    def count_of(*criteria):
+        return db.session.query(func.count(Activity.id)).filter(
+            Activity.project_id == Project.id, *criteria
+        ).scalar_subquery()
+    projects = Project.query
+    if event_id is not None:
+        projects = projects.filter_by(event_id=event_id)
+    count = projects.update({
+        Project.count_stars: count_of(Activity.name == 'star'),
+        Project.count_boosts: count_of(Activity.name == 'boost'),
+        Project.count_activities: count_of(),
+        Project.count_commits: count_of(
+            Activity.name == 'update', Activity.action == 'commit'),
+        Project.last_activity_at: db.session.query(
+            func.max(Activity.timestamp)
+        ).filter(Activity.project_id == Project.id).scalar_subquery(),
+    }, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def ProjectScoresQuery(event_id=None):
+    """Aggregate the score of every project in one statement."""
+    # This must match the rules in Project.calculate_score
+    stars = func.sum(case((Activity.name == 'star', 1), else_=0))
+    boosts = func.sum(case((Activity.name == 'boost', 1), else_=0))
+    points = func.coalesce(Project.progress, 0) \
+        + func.count(Activity.id) + boosts
+    for (field, min_length, value) in SCORE_CONTENT_RULES:
+        text_length = func.length(func.coalesce(getattr(Project, field), ''))
+        points = points + case((text_length > min_length, value), else_=0)
+    score = case(
+        # Challenges only get a point per team-member
+        (and_(Project.progress != None,  # noqa: E711
+              Project.progress <= PR_CHALLENGE), stars),
+        # Cap at 100%
+        (points > 100, 100),
+        else_=points
+    )
+    query = db.session.query(Project.id, Project.score, score) \
+        .outerjoin(Activity, Activity.project_id == Project.id)
+    if event_id is not None:
+        query = query.filter(Project.event_id == event_id)
+    return query.group_by(Project.id)
+
+
+def RescoreEventProjects(event_id=None):
+    """Recalculate and store the scores of an event's projects."""
+    changed = [
+        {'project_id': project_id, 'new_score': int(new_score)}
+        for (project_id, old_score, new_score) in ProjectScoresQuery(event_id)
+        if old_score != new_score
+    ]
+    if changed:
+        projects = Project.__table__
+        db.session.execute(
+            projects.update()
+            .where(projects.c.id == bindparam('project_id'))
+            .values(score=bindparam('new_score')),
+            changed)
+    db.session.commit()
+    return len(changed)
+
+
 def CheckPrevCommits(commit, username, since, until, prevlinks, prevdates):
-    # Check duplicates
+    # Check duplicates, by time only for commits without a link
     if 'url' in commit and commit['url'] is not None:
         if commit['url'] in prevlinks:
             return None
-    if commit['date'].replace(microsecond=0) in prevdates:
+    elif CommitStamp(commit) in prevdates:
         return None
     if commit['date'] < since or commit['date'] > until:
         return None
@@ -297,20 +457,49 @@ def CheckPrevCommits(commit, username, since, until, prevlinks, prevdates):
     return message
 
 
-def SyncCommitData(project, commits):
-    """Collect data for syncing a project from a remote site."""
-    if project.event is None or len(commits) == 0:
-        return
-    prevactivities = Activity.query.filter_by(
-            name='update', action='commit', project_id=project.id
-        ).all()
-    prevdates = [a.timestamp.replace(microsecond=0) for a in prevactivities]
-    prevlinks = [a.ref_url for a in prevactivities]
+def CommitStamp(commit):
+    """Return the commit time in UTC, as it is stored in an activity."""
+    date = commit['date']
+    if date.tzinfo is not None:
+        date = date.astimezone(pytz.utc)
+    return date.replace(microsecond=0, tzinfo=None)
+
+
+def GetPrevCommits(project, commits):
+    """Look up which of the commits have been synced before."""
+    links = [c['url'] for c in commits if c.get('url')]
+    stamps = [CommitStamp(c) for c in commits if not c.get('url')]
+    # Only the rows matching this batch are loaded, using the index
+    found = Activity.ref_url.in_(links)
+    if stamps:
+        found = or_(found, and_(
+            Activity.ref_url.is_(None),
+            Activity.timestamp.between(
+                min(stamps), max(stamps) + dt.timedelta(seconds=1))))
+    query = db.session.query(Activity.ref_url, Activity.timestamp) \
+        .filter_by(name='update', action='commit', project_id=project.id) \
+        .filter(found)
+    prevlinks, prevdates = set(), set()
+    for ref_url, timestamp in query:
+        if ref_url is not None:
+            prevlinks.add(ref_url)
+        else:
+            prevdates.add(timestamp.replace(microsecond=0))
+    return prevlinks, prevdates
+
+
+def SyncCommitBatch(project, commits, since, until, synced_at):
+    """Insert the new commits of a batch in one transaction."""
+    prevlinks, prevdates = GetPrevCommits(project, commits)
     username = None
     user = None
-    since = project.event.starts_at_tz
-    until = project.event.ends_at_tz
+    activities = []
     for commit in commits:
+        # Raise the high-water mark for the next sync
+        if since <= commit['date'] <= until:
+            stamp = CommitStamp(commit)
+            if synced_at is None or stamp > synced_at:
+                synced_at = stamp
         message = CheckPrevCommits(
                         commit, username, since, until, prevlinks, prevdates)
         if message is None:
@@ -319,11 +508,36 @@ def SyncCommitData(project, commits):
         activity = Activity(
             name='update', action='commit',
             project_id=project.id,
-            timestamp=commit['date'],
+            timestamp=CommitStamp(commit),
             content=message
         )
         if 'url' in commit and commit['url'] is not None:
             activity.ref_url = commit['url']
+            prevlinks.add(commit['url'])
+        else:
+            prevdates.add(CommitStamp(commit))
         if user is not None:
             activity.user_id = user.id
-        activity.save()
+        activities.append(activity)
+    if len(activities) > 0:
+        db.session.add_all(activities)
+        db.session.commit()
+    return synced_at
+
+
+def SyncCommitData(project, commits, batch_size=SYNC_BATCH):
+    """Collect data for syncing a project from a remote site."""
+    if project.event is None:
+        return
+    since = project.event.starts_at_tz
+    until = project.event.ends_at_tz
+    synced_at = project.commits_synced_at
+    # Commits may be streamed from the remote, so are consumed in batches
+    commits = iter(commits)
+    batch = list(islice(commits, batch_size))
+    while len(batch) > 0:
+        synced_at = SyncCommitBatch(project, batch, since, until, synced_at)
+        batch = list(islice(commits, batch_size))
+    if synced_at != project.commits_synced_at:
+        project.commits_synced_at = synced_at
+        project.save()
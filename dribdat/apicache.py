@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Conditional request cache for remote repository fetches."""
+# Responses carrying an ETag or Last-Modified header are kept on disk,
+# and revalidated on the next fetch: a 304 Not Modified then counts as
+# a hit, and (on GitHub) does not use up the API rate limit.
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from . import apiclient
+
+# Set up by configure(), as fetches may run outside of an app context
+CACHE_DIR = None
+CACHE_SIZE = 50 * 1024 * 1024  # bytes
+
+STATS = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+STATS_LOCK = threading.Lock()
+
+# Headers which are kept along with the body
+CACHED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+def configure(cache_dir, cache_size=CACHE_SIZE):
+    """Set the location and size limit of the cache, or disable it."""
+    global CACHE_DIR, CACHE_SIZE
+    CACHE_DIR = cache_dir or None
+    CACHE_SIZE = cache_size
+    if CACHE_DIR:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+
+def default_cache_dir():
+    """Return a cache location in the system temporary folder."""
+    return os.path.join(tempfile.gettempdir(), 'dribdat-http-cache')
+
+
+def count(stat, n=1):
+    """Increment a cache counter."""
+    with STATS_LOCK:
+        STATS[stat] += n
+
+
+def cache_stats():
+    """Return the counters of this process, and the size on disk."""
+    with STATS_LOCK:
+        stats = dict(STATS)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0
+    stats['entries'], stats['size'] = 0, 0
+    if CACHE_DIR:
+        for entry in cache_entries():
+            stats['entries'] += 1
+            stats['size'] += entry.stat().st_size
+    stats['limit'] = CACHE_SIZE
+    stats['enabled'] = CACHE_DIR is not None
+    return stats
+
+
+def cache_entries():
+    """List the files in the cache folder."""
+    try:
+        return [e for e in os.scandir(CACHE_DIR)
+                if e.is_file() and e.name.endswith('.cache')]
+    except FileNotFoundError:
+        return []
+
+
+def cache_path(url):
+    """Return the file name of a cache entry."""
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.cache')
+
+
+def load_entry(url):
+    """Read a cached response, or None."""
+    try:
+        with open(cache_path(url), 'rb') as fp:
+            # The first line holds the metadata, followed by the body
+            entry = json.loads(fp.readline())
+            entry['body'] = fp.read()
+    except (OSError, ValueError):
+        return None
+    if entry.get('url') != url:
+        return None
+    return entry
+
+
+def store_entry(url, response):
+    """Save a response to disk, then keep the cache within bounds."""
+    entry = {
+        'url': url,
+        'encoding': response.encoding,
+        'headers': {h: response.headers[h]
+                    for h in CACHED_HEADERS if h in response.headers},
+    }
+    if len(response.content) > CACHE_SIZE:
+        return
+    path = cache_path(url)
+    try:
+        # Write atomically, since fetches run in parallel threads
+        fd, tmppath = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(json.dumps(entry).encode('utf-8') + b'\n')
+            fp.write(response.content)
+        os.replace(tmppath, path)
+    except OSError as ex:
+        logging.warning("Could not write to HTTP cache: %s", ex)
+        return
+    count('stores')
+    evict()
+
+
+def touch_entry(url):
+    """Mark a cache entry as recently used."""
+    try:
+        os.utime(cache_path(url))
+    except OSError:
+        pass
+
+
+def evict():
+    """Remove the least recently used entries above the size limit."""
+    entries = []
+    for e in cache_entries():
+        try:
+            entries.append((e.stat().st_mtime, e.stat().st_size, e.path))
+        except OSError:
+            continue
+    total = sum(e[1] for e in entries)
+    if total <= CACHE_SIZE:
+        return
+    for mtime, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        count('evictions')
+        total -= size
+        if total <= CACHE_SIZE:
+            break
+
+
+def response_from_entry(entry, url):
+    """Rebuild a response object from a cache entry."""
+    response = requests.models.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.encoding = entry['encoding']
+    response._content = entry['body']
+    return response
+
+
+def cached_get(url, **kwargs):
+    """Fetch a URL, revalidating any cached copy of it."""
+    if not CACHE_DIR:
+        return apiclient.get(url, **kwargs)
+    entry = load_entry(url)
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+        if 'ETag' in entry['headers']:
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if 'Last-Modified' in entry['headers']:
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+    response = apiclient.get(url, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        count('hits')
+        touch_entry(url)
+        return response_from_entry(entry, url)
+    count('misses')
+    if response.status_code == 200 and (
+            'ETag' in response.headers or
+            'Last-Modified' in response.headers):
+        store_entry(url, response)
+    return response
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Shared HTTP client for outbound requests to remote services."""
+# One pooled session keeps connections alive between fetches, retries
+# rate limited (429) and failing (5xx) requests with backoff, and keeps
+# per-host statistics of this process for the admin.
+
+import time
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# In seconds, how long to wait for a response by default
+REQUEST_TIMEOUT = 10
+
+# Set up by configure(), as fetches may run outside of an app context
+RETRIES = 3
+BACKOFF = 0.5  # seconds, doubling with each retry
+POOL_SIZE = 10  # connections kept per host
+RETRY_AFTER_MAX = 30  # seconds, longest honoured Retry-After wait
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+SESSION = None
+SESSION_LOCK = threading.Lock()
+
+HOST_STATS = {}
+STATS_LOCK = threading.Lock()
+
+
+class CappedRetry(Retry):
+    """Honours Retry-After, up to a limit which keeps syncs responsive."""
+
+    def get_retry_after(self, response):
+        """Return the requested wait, capped."""
+        retry_after = super(CappedRetry, self).get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, RETRY_AFTER_MAX)
+
+
+def configure(retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+    """Set the retry and pooling options, starting a new session."""
+    global RETRIES, BACKOFF, POOL_SIZE, SESSION
+    RETRIES, BACKOFF, POOL_SIZE = retries, backoff, pool_size
+    with SESSION_LOCK:
+        if SESSION is not None:
+            SESSION.close()
+        SESSION = None
+
+
+def get_session():
+    """Return the shared session, creating it if needed."""
+    global SESSION
+    with SESSION_LOCK:
+        if SESSION is None:
+            retry = CappedRetry(
+                total=RETRIES,
+                connect=min(RETRIES, 1),  # unreachable hosts rarely recover
+                backoff_factor=BACKOFF,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=['GET', 'HEAD'],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE,
+                pool_maxsize=POOL_SIZE,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            SESSION = session
+        return SESSION
+
+
+def record(host, elapsed, status=None, error=None, retries=0):
+    """Add the outcome of a request to the host statistics."""
+    with STATS_LOCK:
+        stats = HOST_STATS.setdefault(host, {
+            'host': host, 'requests': 0, 'errors': 0, 'retries': 0,
+            'total_time': 0.0, 'max_time': 0.0,
+            'last_status': None, 'last_error': None,
+        })
+        stats['requests'] += 1
+        stats['retries'] += retries
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        stats['last_status'] = status
+        if error is not None or (status is not None and status >= 400):
+            stats['errors'] += 1
+            stats['last_error'] = error or 'HTTP %d' % status
+
+
+def host_stats():
+    """Return the statistics of each remote host, busiest first."""
+    with STATS_LOCK:
+        hosts = [dict(s) for s in HOST_STATS.values()]
+    for s in hosts:
+        s['avg_time'] = round(s['total_time'] / s['requests'], 3)
+        s['total_time'] = round(s['total_time'], 3)
+        s['max_time'] = round(s['max_time'], 3)
+    hosts.sort(key=lambda s: s['requests'], reverse=True)
+    return hosts
+
+
+def get(url, **kwargs):
+    """Make a GET request through the shared session."""
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    host = urlparse(url).netloc.lower()
+    started = time.monotonic()
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.exceptions.RequestException as ex:
+        record(host, time.monotonic() - started, error=type(ex).__name__)
+        raise
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+    record(host, time.monotonic() - started, response.status_code,
+           retries=len(retries))
+    return response
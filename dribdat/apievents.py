@@ -1,27 +1,75 @@
 # -*- coding: utf-8 -*-
 """Collect events from remote repositories."""
 
+import pytz
 import logging
-import requests
 from dateutil import parser
+from . import apiclient
 
 # In seconds, how long to wait for API response
 REQUEST_TIMEOUT = 10
 
+# How many commits to request per page
+COMMITS_PER_PAGE = 50
+# Pages read without a start time (e.g. for previews), else all of them
+COMMITS_LATEST_PAGES = 1
 
-def fetch_commits_gitea(full_name, limit=10):
-    """Parse data about Gitea commits."""
-    apiurl = "https://codeberg.org/api/v1/repos/%s/commits?limit=%d" % (
-        full_name, limit)
-    data = requests.get(apiurl, timeout=REQUEST_TIMEOUT)
-    if data.status_code != 200:
-        logging.warning("Could not sync Gitea commits on %s" % full_name)
-        return []
-    json = data.json()
-    if 'message' in json:
-        logging.warning("Could not sync Gitea commits on %s: %s"
-                     % (full_name, json['message']))
-        return []
+
+def format_query_date(datestamp):
+    """Format a time as UTC for API query strings."""
+    if datestamp.tzinfo is not None:
+        datestamp = datestamp.astimezone(pytz.utc)
+    return datestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def fetch_pages(apiurl, source, max_pages=None):
+    """Yield the pages of a remote list, following the Link headers."""
+    count = 0
+    while apiurl and (max_pages is None or count < max_pages):
+        data = apiclient.get(apiurl, timeout=REQUEST_TIMEOUT)
+        if data.status_code != 200:
+            logging.warning("Could not sync %s: HTTP %d"
+                            % (source, data.status_code))
+            return
+        try:
+            json = data.json()
+        except ValueError:
+            logging.warning("Could not sync %s: invalid response" % source)
+            return
+        if not isinstance(json, list):
+            if 'message' in json:
+                logging.warning("Could not sync %s: %s"
+                                % (source, json['message']))
+            return
+        if len(json) == 0:
+            return
+        yield json
+        count += 1
+        apiurl = data.links.get('next', {}).get('url')
+
+
+def iter_commits(pages, parse):
+    """Yield the commits of each page, as it is fetched."""
+    # Commit dates are not in order (e.g. after a rebase), so the history
+    # is read to the end: the remote already leaves out older commits
+    for page in pages:
+        for commit in parse(page):
+            yield commit
+
+
+def iter_commits_gitea(full_name, since=None):
+    """Stream the Gitea commit history, one page at a time."""
+    apiurl = "https://codeberg.org/api/v1/repos/%s/commits?limit=%d&page=1" \
+        % (full_name, COMMITS_PER_PAGE)
+    if since is not None:
+        apiurl += "&since=%s" % format_query_date(since)
+    pages = fetch_pages(apiurl, "Gitea commits on %s" % full_name,
+                        None if since else COMMITS_LATEST_PAGES)
+    return iter_commits(pages, parse_gitea_commits)
+
+
+def parse_gitea_commits(json):
+    """Standardize data from a Gitea commit log."""
     commitlog = []
     for entry in json:
         if 'commit' not in entry:
@@ -43,23 +91,18 @@ def fetch_commits_gitea(full_name, limit=10):
     return commitlog
 
 
-def fetch_commits_github(full_name, since=None, until=None):
-    """Parse data about GitHub commits."""
-    apiurl = "https://api.github.com/repos/%s/commits?per_page=50" % full_name
+def iter_commits_github(full_name, since=None, until=None):
+    """Stream the GitHub commit history, one page at a time."""
+    apiurl = "https://api.github.com/repos/%s/commits?per_page=%d" \
+        % (full_name, COMMITS_PER_PAGE)
     if since is not None:
-        apiurl += "&since=%s" % since.replace(microsecond=0).isoformat()
+        apiurl += "&since=%s" % format_query_date(since)
     if until is not None:
-        apiurl += "&until=%s" % until.replace(microsecond=0).isoformat()
-    data = requests.get(apiurl, timeout=REQUEST_TIMEOUT)
-    if data.status_code != 200:
-        logging.warning("Could not sync GitHub commits on %s" % full_name)
-        return []
-    json = data.json()
-    if 'message' in json:
-        logging.warning("Could not sync GitHub commits on %s: %s"
-                     % (full_name, json['message']))
-        return []
-    return parse_github_commits(json, full_name)
+        apiurl += "&until=%s" % format_query_date(until)
+    pages = fetch_pages(apiurl, "GitHub commits on %s" % full_name,
+                        None if since else COMMITS_LATEST_PAGES)
+    return iter_commits(
+        pages, lambda page: parse_github_commits(page, full_name))
 
 
 def parse_github_commits(json, full_name):
@@ -89,22 +132,22 @@ def parse_github_commits(json, full_name):
     return commitlog
 
 
-def fetch_commits_gitlab(project_id: int, since=None, until=None):
-    """Parse data about GitLab commits."""
+def iter_commits_gitlab(project_id: int, since=None, until=None):
+    """Stream the GitLab commit history, one page at a time."""
     apiurl = 'https://gitlab.com/api/v4/'
-    apiurl = apiurl + "projects/%d/repository/commits?" % project_id
+    apiurl = apiurl + "projects/%d/repository/commits?per_page=%d&page=1" \
+        % (project_id, COMMITS_PER_PAGE)
     if since is not None:
-        apiurl += "&since=%s" % since.replace(microsecond=0).isoformat()
+        apiurl += "&since=%s" % format_query_date(since)
     if until is not None:
-        apiurl += "&until=%s" % until.replace(microsecond=0).isoformat()
-    # Collect basic data
-    data = requests.get(apiurl, timeout=REQUEST_TIMEOUT)
-    if data.text.find('{') < 0:
-        return []
-    json = data.json()
-    if 'message' in json:
-        logging.warning("Could not sync GitLab commits", json['message'])
-        return []
+        apiurl += "&until=%s" % format_query_date(until)
+    pages = fetch_pages(apiurl, "GitLab commits on %d" % project_id,
+                        None if since else COMMITS_LATEST_PAGES)
+    return iter_commits(pages, parse_gitlab_commits)
+
+
+def parse_gitlab_commits(json):
+    """Standardize data from a GitLab commit log."""
     commitlog = []
     for commit in json:
         if 'message' not in commit:
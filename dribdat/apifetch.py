@@ -11,10 +11,12 @@ from flask_misaka import markdown
 from bleach.sanitizer import ALLOWED_ATTRIBUTES
 from urllib.parse import quote_plus
 from .apievents import (
-    fetch_commits_github,
-    fetch_commits_gitlab,
-    fetch_commits_gitea,
+    iter_commits_github,
+    iter_commits_gitlab,
+    iter_commits_gitea,
 )
+from . import apiclient
+from .apicache import cached_get
 from .utils import (
     sanitize_url, load_presets, load_yaml_presets, fix_relative_links
 )
@@ -31,7 +33,7 @@ def FetchStageConfig(url, top_element='stages', by_col='name'):
         logging.info("Loading stages from file")
         return load_yaml_presets(top_element, by_col, url)
     logging.info("Loading stages from URL")
-    data = requests.get(url, timeout=REQUEST_TIMEOUT)
+    data = apiclient.get(url, timeout=REQUEST_TIMEOUT)
     if data.text.find('stages:') < 0:
         logging.debug("No stage data", data.text)
         return {}
@@ -39,7 +41,7 @@ def FetchStageConfig(url, top_element='stages', by_col='name'):
     return load_presets(blob, top_element, by_col)
 
 
-def FetchGiteaProject(project_url):
+def FetchGiteaProject(project_url, since=None):
     """Download data from Codeberg, a large Gitea site."""
     # Docs: https://codeberg.org/api/swagger
     site_root = "https://codeberg.org"
@@ -48,7 +50,7 @@ def FetchGiteaProject(project_url):
     api_content = api_repos + "/contents"
     # Collect basic data
     logging.info("Fetching Gitea", url_q)
-    data = requests.get(api_repos, timeout=REQUEST_TIMEOUT)
+    data = cached_get(api_repos, timeout=REQUEST_TIMEOUT)
     if data.text.find('{') < 0:
         logging.debug("No data", data.text)
         return {}
@@ -57,14 +59,14 @@ def FetchGiteaProject(project_url):
         logging.debug("Invalid data", data.text)
         return {}
     # Collect the README
-    data = requests.get(api_content, timeout=REQUEST_TIMEOUT)
+    data = cached_get(api_content, timeout=REQUEST_TIMEOUT)
     readme = ""
     if not data.text.find('{') < 0:
         readmeurl = None
         for repo_file in data.json():
             if 'readme' in repo_file['name'].lower():
                 readmeurl = repo_file['download_url']
-                readmedata = requests.get(readmeurl, timeout=REQUEST_TIMEOUT)
+                readmedata = cached_get(readmeurl, timeout=REQUEST_TIMEOUT)
                 readme = readmedata.text
                 break
         if readmeurl is None:
@@ -80,18 +82,18 @@ def FetchGiteaProject(project_url):
         'source_url': json['html_url'],
         'image_url': json['avatar_url'] or json['owner']['avatar_url'],
         'contact_url': issuesurl,
-        'commits': fetch_commits_gitea(url_q)
+        'commits': iter_commits_gitea(url_q, since=since)
     }
 
 
-def FetchGitlabProject(project_url):
+def FetchGitlabProject(project_url, since=None):
     """Download data from GitLab."""
     WEB_BASE = "https://gitlab.com"
     API_BASE = WEB_BASE + "/api/v4/projects/%s"
     url_q = quote_plus(project_url)
     # Collect basic data
     logging.info("Fetching GitLab", url_q)
-    data = requests.get(API_BASE % url_q, timeout=REQUEST_TIMEOUT)
+    data = cached_get(API_BASE % url_q, timeout=REQUEST_TIMEOUT)
     if data.text.find('{') < 0:
         logging.debug("No data", data.text)
         return {}
@@ -102,7 +104,7 @@ def FetchGitlabProject(project_url):
     # Collect the README
     readmeurl = json['readme_url'] + '?inline=false'
     readmeurl = readmeurl.replace('-/blob/', '-/raw/')
-    readmedata = requests.get(readmeurl, timeout=REQUEST_TIMEOUT)
+    readmedata = cached_get(readmeurl, timeout=REQUEST_TIMEOUT)
     readme = readmedata.text or ""
     return {
         'type': 'GitLab',
@@ -112,14 +114,14 @@ def FetchGitlabProject(project_url):
         'source_url': json['web_url'],
         'image_url': json['avatar_url'],
         'contact_url': json['web_url'] + '/issues',
-        'commits': fetch_commits_gitlab(json['id'])
+        'commits': iter_commits_gitlab(json['id'], since)
     }
 
 
 def FetchGitlabAvatar(email):
     """Download a user avatar from GitLab."""
     apiurl = "https://gitlab.com/api/v4/avatar?email=%s&size=80"
-    data = requests.get(apiurl % email, timeout=REQUEST_TIMEOUT)
+    data = apiclient.get(apiurl % email, timeout=REQUEST_TIMEOUT)
     if data.text.find('{') < 0:
         logging.debug("No data", data.text)
         return None
@@ -129,11 +131,11 @@ def FetchGitlabAvatar(email):
     return json['avatar_url']
 
 
-def FetchGithubProject(project_url):
+def FetchGithubProject(project_url, since=None):
     """Download data from GitHub."""
     API_BASE = "https://api.github.com/repos/%s"
     logging.info("Fetching GitHub", project_url)
-    data = requests.get(API_BASE % project_url, timeout=REQUEST_TIMEOUT)
+    data = cached_get(API_BASE % project_url, timeout=REQUEST_TIMEOUT)
     if data.text.find('{') < 0:
         logging.debug("No data", data.text)
         return {}
@@ -144,7 +146,7 @@ def FetchGithubProject(project_url):
     repo_full_name = json['full_name']
     default_branch = json['default_branch'] or 'main'
     readmeurl = "%s/readme" % (API_BASE % project_url)
-    readmedata = requests.get(readmeurl, timeout=REQUEST_TIMEOUT)
+    readmedata = cached_get(readmeurl, timeout=REQUEST_TIMEOUT)
     readme = ''
     if readmedata.text.find('{') < 0:
         logging.debug("No readme", data.text)
@@ -167,7 +169,7 @@ def FetchGithubProject(project_url):
         'image_url': json['owner']['avatar_url'],
         'contact_url': json['html_url'] + '/issues',
         'download_url': json['html_url'] + '/releases',
-        'commits': fetch_commits_github(repo_full_name)
+        'commits': iter_commits_github(repo_full_name, since)
     }
 
 
@@ -176,7 +178,7 @@ def FetchBitbucketProject(project_url):
     WEB_BASE = "https://bitbucket.org/%s"
     API_BASE = "https://api.bitbucket.org/2.0/repositories/%s"
     logging.info("Fetching Bitbucket", project_url)
-    data = requests.get(API_BASE % project_url, timeout=REQUEST_TIMEOUT)
+    data = cached_get(API_BASE % project_url, timeout=REQUEST_TIMEOUT)
     if data.text.find('{') < 0:
         logging.debug('No data at', project_url)
         return {}
@@ -186,7 +188,7 @@ def FetchBitbucketProject(project_url):
         return {}
     readme = ''
     for docext in ['.md', '.rst', '.txt', '']:
-        readmedata = requests.get(
+        readmedata = cached_get(
             API_BASE % project_url + '/src/HEAD/README.md',
             timeout=REQUEST_TIMEOUT)
         if readmedata.text.find('{"type":"error"') != 0:
@@ -220,7 +222,7 @@ def FetchDataProject(datapackage_url):
     # TODO: use frictionlessdata library!
     project_url = datapackage_url.replace('datapackage.json', '')
     project_url = sanitize_url(project_url) + 'datapackage.json'
-    data = requests.get(project_url, timeout=REQUEST_TIMEOUT)
+    data = apiclient.get(project_url, timeout=REQUEST_TIMEOUT)
     # TODO: treat dribdat events as special
     logging.info("Fetching Data Package", project_url)
     if data.text.find('{') < 0:
@@ -279,7 +281,7 @@ def FetchDribdatProject(dribdat_url):
     """Try to load a Dribdat project from a remote page."""
     project_url = dribdat_url.replace('/project/', '/api/project/') 
     project_url = sanitize_url(project_url) + '?full=1'
-    data = requests.get(project_url, timeout=REQUEST_TIMEOUT)
+    data = apiclient.get(project_url, timeout=REQUEST_TIMEOUT)
     # TODO: treat dribdat events as special
     logging.info("Fetching Dribdat site", project_url)
     if data.text.find('{') < 0:
@@ -323,7 +325,7 @@ def RequestRemoteContent(project_url):
         # fetch remote content.
         project_url = sanitize_url(project_url)
         logging.info("Fetching", project_url)
-        data = requests.get(project_url, timeout=REQUEST_TIMEOUT)
+        data = cached_get(project_url, timeout=REQUEST_TIMEOUT)
         return data.text or None
     except requests.exceptions.RequestException:
         logging.warning("Could not connect to %s" % project_url)
@@ -430,7 +432,7 @@ def FetchWebEtherpad(text, url):
     ptitle = url.split('/')[-1]
     if len(ptitle) < 1:
         return {}
-    text_content = requests.get(
+    text_content = apiclient.get(
         "%s/export/txt" % url,
         timeout=REQUEST_TIMEOUT).text
     obj = {}
@@ -465,7 +467,7 @@ def FetchWebGitHub(url):
         return {}
     filename = url.split('/')[-1].replace('.md', '')
     rawurl = url.replace('/blob/', '/raw/').replace("https://github.com/", '')
-    rawdata = requests.get("https://github.com/" + rawurl, timeout=REQUEST_TIMEOUT)
+    rawdata = apiclient.get("https://github.com/" + rawurl, timeout=REQUEST_TIMEOUT)
     text_content = rawdata.text or ""
     return {
         'type': 'Markdown',
@@ -479,7 +481,7 @@ def FetchWebGitHub(url):
 def FetchWebGitHubGist(url):
     """Grab a Markdown source from a GitHub Gist link."""
     rawurl = url.replace("https://gist.github.com/", '') + '/raw'
-    rawdata = requests.get("https://gist.githubusercontent.com/" + rawurl, timeout=REQUEST_TIMEOUT)
+    rawdata = apiclient.get("https://gist.githubusercontent.com/" + rawurl, timeout=REQUEST_TIMEOUT)
     text_content = rawdata.text or ""
     return {
         'type': 'Markdown',
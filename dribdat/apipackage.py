@@ -12,6 +12,7 @@ from datetime import datetime as dtt
 from frictionless import Package, Resource
 from .user.models import Event, Project, Activity, Category, User, Role
 from .utils import format_date
+from . import apiclient
 from .apiutils import (
     get_project_list,
     get_event_users,
@@ -271,7 +272,7 @@ def fetch_datapackage(url, dry_run=False, all_data=False):
         logging.error("Invalid URL", url)
         return {}
     try:
-        data = requests.get(url, timeout=REQUEST_TIMEOUT).json()
+        data = apiclient.get(url, timeout=REQUEST_TIMEOUT).json()
         return import_event_package(data, dry_run, all_data)
     except json.decoder.JSONDecodeError:
         return {'errors': ['Could not load package due to JSON error']}
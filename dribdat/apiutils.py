@@ -7,13 +7,18 @@ import csv
 import json
 
 from datetime import datetime
+from itertools import islice
+from flask import current_app
+from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import selectinload
 
 from dribdat.user.models import Event, Project, Category, Activity
 from dribdat.utils import format_date
 from .aggregation import GetEventUsers
 
-from sys import version_info
-PY3 = version_info[0] == 3
+STREAM_BATCH = 100  # rows loaded at a time when streaming
+CSV_CHUNK = 16 * 1024  # characters of CSV sent at a time
+JSON_CHUNK = 16 * 1024  # characters of JSON sent at a time
 
 
 def get_projects_by_event(event_id):
@@ -21,8 +26,36 @@ def get_projects_by_event(event_id):
     return Project.query.filter_by(event_id=event_id, is_hidden=False)
 
 
-def get_event_activities(event_id=None, limit=50, q=None, action=None):
+def iter_batches(query, batch_size=STREAM_BATCH):
+    """Iterate over the results of a query in lists, as the cursor advances."""
+    rows = iter(query.yield_per(batch_size))
+    batch = list(islice(rows, batch_size))
+    while len(batch) > 0:
+        yield batch
+        batch = list(islice(rows, batch_size))
+
+
+def get_event_activities(event_id=None, limit=50, q=None, action=None,
+                         before_id=None, after_id=None, **filters):
     """Fetch activities of a given event."""
+    query = query_event_activities(event_id, q, action, **filters)
+    results = page_activities(query, limit, before_id, after_id)
+    return [a.data for a in results]
+
+
+def iter_event_activities(event_id=None, limit=50, q=None, action=None,
+                          before_id=None, **filters):
+    """Stream the activities of a given event."""
+    # The query is prepared right away, so that a missing event is a 404
+    query = query_event_activities(event_id, q, action, **filters)
+    if before_id is not None:
+        query = query.filter(Activity.id < before_id)
+    query = query.order_by(Activity.id.desc()).limit(limit)
+    return (a.data for batch in iter_batches(query) for a in batch)
+
+
+def query_event_activities(event_id=None, q=None, action=None, **filters):
+    """Query the activities of a given event."""
     if event_id is not None:
         event = Event.query.filter_by(id=event_id).first_or_404()
         query = Activity.query \
@@ -33,10 +66,37 @@ def get_event_activities(event_id=None, limit=50, q=None, action=None):
     if q is not None:
         q = "%%%s%%" % q
         query = query.filter(Activity.content.like(q))
+    return filter_activities(query, action=action, **filters)
+
+
+def filter_activities(query, name=None, action=None, user_id=None,
+                      project_id=None):
+    """Narrow down a query of activities."""
+    if name is not None:
+        query = query.filter(Activity.name == name)
     if action is not None:
         query = query.filter(Activity.action == action)
-    results = query.order_by(Activity.id.desc()).limit(limit).all()
-    return [a.data for a in results]
+    if user_id is not None:
+        query = query.filter(Activity.user_id == user_id)
+    if project_id is not None:
+        query = query.filter(Activity.project_id == project_id)
+    return query
+
+
+def page_activities(query, limit, before_id=None, after_id=None):
+    """Fetch activities, latest first, older or newer than a known one."""
+    query = query.options(
+        selectinload(Activity.user),
+        selectinload(Activity.project),
+    )
+    if after_id is not None:
+        # The next ones after the cursor, then in the usual order
+        query = query.filter(Activity.id > after_id)
+        results = query.order_by(Activity.id.asc()).limit(limit).all()
+        return results[::-1]
+    if before_id is not None:
+        query = query.filter(Activity.id < before_id)
+    return query.order_by(Activity.id.desc()).limit(limit).all()
 
 
 def get_event_categories(event_id=None):
@@ -78,28 +138,80 @@ def get_event_users(event, full_data=False):
 def get_project_summaries(projects, host_url, is_moar=False):
     """Collect data for each project in a list."""
     summaries = []
-    for project in projects:
-        p = project.data
-        if is_moar:
-            p['stats'] = project.get_stats()
-            p['autotext'] = project.autotext  # Markdown
-            p['longtext'] = project.longtext  # Markdown - see longhtml()
-        else:
-            stats = project.get_stats()
-            for k in stats.keys():
-                p['stats-' + k] = stats[k]
-        summaries.append(p)
+    projects = Project.bulk_load(projects)
+    stats = Project.bulk_stats(projects)
+    for project, p in zip(projects, Project.bulk_data(projects)):
+        summaries.append(
+            add_project_stats(project, p, is_moar, stats[project.id]))
     summaries = expand_project_urls(summaries, host_url)
     summaries.sort(key=lambda x: x['score'] or 0, reverse=True)
     return summaries
 
 
+def iter_project_summaries(projects, host_url, is_moar=False,
+                           cursor=None, limit=None):
+    """Stream the data of each project in a query, by score."""
+    score = func.coalesce(Project.score, 0)
+    query = Project.bulk_query(projects)
+    if cursor is not None:
+        # Continue after the last project of the previous page
+        last_score, last_id = cursor
+        query = query.filter(or_(
+            score < last_score,
+            and_(score == last_score, Project.id > last_id)))
+    query = query.order_by(score.desc(), Project.id)
+    if limit is not None:
+        query = query.limit(limit)
+    for batch in iter_batches(query):
+        stats = Project.bulk_stats(batch)
+        summaries = [
+            add_project_stats(project, p, is_moar, stats[project.id])
+            for project, p in zip(batch, Project.bulk_data(batch))
+        ]
+        yield from expand_project_urls(summaries, host_url)
+
+
+def project_cursor(p):
+    """Return the pagination cursor pointing after a project."""
+    return '%d:%d' % (p['score'] or 0, p['id'])
+
+
+def parse_project_cursor(cursor):
+    """Read a pagination cursor, raising ValueError if it is invalid."""
+    if not cursor:
+        return None
+    last_score, last_id = cursor.split(':')
+    return int(last_score), int(last_id)
+
+
+def add_project_stats(project, p, is_moar=False, stats=None):
+    """Add statistics, and optionally the full text, to project data."""
+    if stats is None:
+        stats = project.get_stats()
+    if is_moar:
+        p['stats'] = stats
+        p['autotext'] = project.autotext  # Markdown
+        p['longtext'] = project.longtext  # Markdown - see longhtml()
+    else:
+        for k in stats.keys():
+            p['stats-' + k] = stats[k]
+    return p
+
+
 def get_project_list(event_id, host_url='', full_data=False):
     """Collect all projects and challenges for an event."""
     projects = get_projects_by_event(event_id)
     return get_project_summaries(projects, host_url, full_data)
 
 
+def iter_project_list(event_id, host_url='', full_data=False,
+                      cursor=None, limit=None):
+    """Stream all projects and challenges of an event."""
+    projects = get_projects_by_event(event_id)
+    return iter_project_summaries(
+        projects, host_url, full_data, cursor, limit)
+
+
 def expand_project_urls(projects, host_url):
     """Expand the URLs of projects with that of the host server."""
     for p in projects:
@@ -129,42 +241,72 @@ def get_schema_for_user_projects(user, host_url):
     return my_schema
 
 
-def gen_rows(csvdata):
-    """Generate rows from data."""
-    rkrows = []
-    headerline = list(csvdata[0].keys())
-    rkrows.append(headerline)
+def gen_row(rk, headerline):
+    """Format the values of a data row for CSV."""
+    rkline = []
+    for key in headerline:
+        line = rk.get(key)
+        if line is None:
+            rkline.append("")
+        elif isinstance(line, (int, float, datetime, str)):
+            rkline.append(str(line))
+        elif isinstance(line, (dict)):
+            rkline.append(json.dumps(line))
+        else:
+            rkline.append(line.encode('utf-8'))
+    return rkline
+
+
+def stream_csv(csvdata):
+    """Generate a CSV file from data rows, as they come in."""
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC)
+    headerline = None
     for rk in csvdata:
-        rkline = []
-        for line in rk.values():
-            if line is None:
-                rkline.append("")
-            elif isinstance(line, (int, float, datetime, str)):
-                rkline.append(str(line))
-            elif isinstance(line, (dict)):
-                rkline.append(json.dumps(line))
-            else:
-                rkline.append(line.encode('utf-8'))
-        rkrows.append(rkline)
-    return rkrows
+        if headerline is None:
+            # Columns are those of the first row
+            headerline = list(rk.keys())
+            writer.writerow(headerline)
+        writer.writerow(gen_row(rk, headerline))
+        if output.tell() >= CSV_CHUNK:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell() > 0:
+        yield output.getvalue()
 
 
 def gen_csv(csvdata):
     """Generate a CSV file from data rows."""
-    if len(csvdata) < 1:
-        return ""
-    rowdata = gen_rows(csvdata)
-    headerline = rowdata[0]
-    if PY3:
-        output = io.StringIO()
-    else:
-        output = io.BytesIO()
-        headerline = [ln.encode('utf-8') for ln in headerline]
-    writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(headerline)
-    for rk in rowdata[1:]:
-        writer.writerow(rk)
-    return output.getvalue()
+    return ''.join(stream_csv(csvdata))
+
+
+def stream_json(name, items, limit=None, cursor_of=None, **fields):
+    """Generate a JSON object with a list of items, as they come in."""
+    dumps = current_app.json.dumps
+    chunk = ['{']
+    for key, value in fields.items():
+        chunk.append('%s: %s, ' % (dumps(key), dumps(value)))
+    chunk.append('%s: [' % dumps(name))
+    count = 0
+    size = 0
+    last = None
+    for last in items:
+        item = dumps(last)
+        chunk.append(item if count == 0 else ', ' + item)
+        count += 1
+        size += len(item)
+        if size >= JSON_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    chunk.append(']')
+    if cursor_of is not None:
+        # A full page may be followed by another one
+        more = limit is not None and count == limit and last is not None
+        chunk.append(', "next": %s' % dumps(cursor_of(last) if more else None))
+    chunk.append('}')
+    yield ''.join(chunk)
 
 
 def event_upload_configuration(import_level='test'):
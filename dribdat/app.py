@@ -11,7 +11,7 @@ from micawber.providers import bootstrap_basic
 from whitenoise import WhiteNoise
 from pytz import timezone
 from urllib.parse import quote_plus
-from dribdat import commands, public, admin
+from dribdat import commands, public, admin, apicache, apiclient, sqlstats
 from dribdat.assets import assets  # noqa: I005
 from dribdat.sso import get_auth_blueprint
 from dribdat.extensions import (
@@ -23,7 +23,8 @@ from dribdat.extensions import (
 )
 from dribdat.settings import ProdConfig  # noqa: I005
 from dribdat.utils import timesince
-from dribdat.onebox import make_oembedplus
+from dribdat.onebox import OneboxEngine
+from dribdat.htmlcache import cached_filter
 
 
 def init_app(config_object=ProdConfig):
@@ -72,9 +73,35 @@ def register_extensions(app):
     migrate.init_app(app, db)
     init_mailman(app)
     init_talisman(app)
+    init_apiclient(app)
+    init_apicache(app)
+    init_sqlstats(app)
     return None
 
 
+def init_apiclient(app):
+    """Initialize the shared client for remote requests."""
+    apiclient.configure(
+        app.config['HTTP_RETRIES'],
+        app.config['HTTP_BACKOFF'],
+        app.config['HTTP_POOL_SIZE'])
+
+
+def init_apicache(app):
+    """Initialize the cache of remote fetches."""
+    if not app.config['HTTP_CACHE']:
+        return apicache.configure(None)
+    apicache.configure(
+        app.config['HTTP_CACHE_DIR'] or apicache.default_cache_dir(),
+        app.config['HTTP_CACHE_SIZE'] * 1024 * 1024)
+
+
+def init_sqlstats(app):
+    """Initialize the instrumentation of database queries."""
+    if app.config['SQL_STATS']:
+        sqlstats.init_app(app)
+
+
 def init_mailman(app):
     """Initialize mailer support."""
     if 'MAIL_SERVER' in app.config and app.config['MAIL_SERVER']:
@@ -152,11 +179,14 @@ def register_filters(app):
     # Registration of handlers for micawber
     app.oembed_providers = bootstrap_basic()
 
-    @app.template_filter()
-    def onebox(value):
-        return make_oembedplus(
-            value, app.oembed_providers, maxwidth=600, maxheight=400
-        )
+    app.onebox = OneboxEngine(
+        app.oembed_providers, maxwidth=600, maxheight=400
+    )
+
+    # Oneboxes are cached box by box, Markdown as a whole
+    app.jinja_env.filters['onebox'] = app.onebox.render
+    app.jinja_env.filters['markdown'] = cached_filter(
+        'markdown', app.jinja_env.filters['markdown'])
 
     # Timezone helper
     app.tz = timezone(app.config['TIME_ZONE'])
@@ -1,10 +1,13 @@
 """Boxout module for Data Packages."""
 
 import re
+import time
+import hashlib
 import logging
 import pystache
 from datetime import datetime
 from frictionless import Package
+from ..apicache import cached_get
 
 TEMPLATE_PACKAGE = r"""
 <div class="boxout datapackage card mb-4" style="max-width:23em">
@@ -53,6 +56,9 @@ TEMPLATE_PACKAGE = r"""
 
 dpkg_url_re = re.compile(r'.*(http?s:\/\/.+datapackage\.json)\)*')
 
+PREVIEW_TIMEOUT = 24 * 3600  # seconds a preview is kept
+PREVIEW_REVALIDATE = 300  # seconds before checking the package for changes
+
 
 def chk_datapackage(line):
     """Check the url matching dataset pattern."""
@@ -61,25 +67,48 @@ def chk_datapackage(line):
         or line.endswith('datapackage.json)'))
 
 
+def preview_key(url):
+    """Return the cache key of a Data Package preview."""
+    return 'box-dpkg/%s' % hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def package_version(response):
+    """Identify the revision of a package, preferably by its ETag."""
+    return response.headers.get('ETag') or \
+        response.headers.get('Last-Modified') or \
+        hashlib.sha256(response.content).hexdigest()
+
+
 def box_datapackage(line, cache=None):
     """Create a OneBox for local projects."""
     m = dpkg_url_re.match(line)
     if not m:
         return None
     url = m.group(1)
-    if cache and cache.has(url):
-        return cache.get(url)
+    base_url = url.replace('/datapackage.json', '')
+    key = preview_key(url)
+    preview = cache.get(key) if cache else None
+    if preview and time.time() - preview['checked'] < PREVIEW_REVALIDATE:
+        return preview['box']
     try:
         logging.info("Fetching Data Package: <%s>" % url)
-        package = Package(url)
+        response = cached_get(url)
+        response.raise_for_status()
+        version = package_version(response)
+        if preview and preview['version'] == version:
+            # Unchanged since it was rendered
+            preview['checked'] = time.time()
+            cache.set(key, preview, timeout=PREVIEW_TIMEOUT)
+            return preview['box']
+        # Relative paths are resolved from the location of the package
+        package = Package(response.json(), basepath=base_url)
     except Exception:  # noqa: B902
         logging.warning("Data Package not parsed: <%s>" % url)
-        return None
+        return preview['box'] if preview else None
     if package.created:
         dt = datetime.fromisoformat(package.created).strftime("%d.%m.%Y")
     else:
         dt = ''
-    base_url = url.replace('/datapackage.json', '')
     # Adjust for absolute URLs
     for r in range(0, len(package.resources)):
         if not 'path' in package.resources[r]:
@@ -91,7 +120,8 @@ def box_datapackage(line, cache=None):
     box = pystache.render(
         TEMPLATE_PACKAGE, {'url': url, 'dp': package, 'date': dt})
     if cache:
-        cache.set(url, box)
-    if cache and cache.has(url):
+        cache.set(key, {
+            'version': version, 'checked': time.time(), 'box': box,
+        }, timeout=PREVIEW_TIMEOUT)
         logging.debug("Cached Data Package: <%s>" % url)
     return box
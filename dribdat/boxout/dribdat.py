@@ -24,16 +24,35 @@ TEMPLATE_PROJECT = r"""
 """
 
 
-def box_project(url):
+# Fields of the project data used in the template
+PREVIEW_FIELDS = [
+    'name', 'summary', 'image_url', 'is_challenge', 'progress', 'phase',
+    'event_name',
+]
+PREVIEW_TIMEOUT = 24 * 3600  # seconds, previews are removed on changes
+
+
+def preview_key(project_id):
+    """Return the cache key of a project preview."""
+    return 'box-project/%d' % project_id
+
+
+def box_project(url, cache=None):
     """Create a OneBox for local projects."""
     project_id = url.split('/')[-1].split('#')[0]
     if not project_id or not project_id.isnumeric():
         return None
-    from ..user.models import Project
-    project = Project.query.filter_by(id=int(project_id)).first()
-    if not project:
-        return None
-    pd = project.data
+    key = preview_key(int(project_id))
+    pd = cache.get(key) if cache else None
+    if pd is None:
+        from ..user.models import Project
+        project = Project.query.filter_by(id=int(project_id)).first()
+        if not project:
+            return None
+        data = project.data
+        pd = {k: data[k] for k in PREVIEW_FIELDS if k in data}
+        if cache:
+            cache.set(key, pd, timeout=PREVIEW_TIMEOUT)
     # project.url returns a relative path
-    pd['link'] = url
+    pd = dict(pd, link=url)
     return pystache.render(TEMPLATE_PROJECT, pd)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Cache of rendered Markdown."""
+# The output of text filters is kept in the Flask-Caching backend, keyed
+# by a hash of the source text: any edit changes the key. Oneboxes are not
+# kept as a whole, as they show data which changes without the text: each
+# kind of box has its own cache instead (see onebox.py and boxout).
+
+import hashlib
+from flask import current_app
+from markupsafe import Markup
+from dribdat.extensions import cache
+
+# Increment whenever the output of the filters changes
+RENDER_VERSION = 1
+
+
+def render_key(renderer, text):
+    """Return the cache key of a rendered text."""
+    digest = hashlib.sha256()
+    for part in [str(RENDER_VERSION), renderer, text]:
+        digest.update(part.encode('utf-8') + b'\0')
+    return 'render/%s/%s' % (renderer, digest.hexdigest())
+
+
+def cached_filter(renderer, fn):
+    """Wrap a text filter, so that its output is cached."""
+    def render(text, **options):
+        # Only plain calls are cached, options being rarely used
+        if not text or not isinstance(text, str) or options:
+            return fn(text, **options)
+        key = render_key(renderer, text)
+        hit = cache.get(key)
+        if hit is not None:
+            is_markup, html = hit
+            return Markup(html) if is_markup else html
+        html = fn(text)
+        cache.set(key, (isinstance(html, Markup), str(html)),
+                  timeout=current_app.config['RENDER_CACHE_TIMEOUT'])
+        return html
+    render.__doc__ = fn.__doc__
+    return render
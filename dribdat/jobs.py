@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Background jobs for slow remote and file operations."""
+# Jobs are stored in the database. By default they run within the request,
+# with JOB_BACKEND=database they are instead picked up by the worker command.
+
+import json
+import time
+import tempfile
+import logging
+import datetime as dt
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from dribdat.database import db
+from dribdat.user.models import Job, Event, Project
+from dribdat.aggregation import (
+    GetProjectData,
+    SyncProjectData,
+    SyncEventProjects,
+    ProjectActivity,
+)
+from dribdat.apipackage import import_event_package, event_to_data_package
+
+JOB_LEASE = 3600  # seconds until a running job is presumed to have crashed
+
+TASKS = {}
+
+
+class JobError(Exception):
+    """A task failure which should not be retried."""
+
+
+def task(name, max_attempts=3):
+    """Register a function as a background task."""
+    def register(fn):
+        TASKS[name] = (fn, max_attempts)
+        return fn
+    return register
+
+
+def enqueue(name, user=None, reuse=False, **params):
+    """Add a job to the queue, returning it for status polling."""
+    if name not in TASKS:
+        raise KeyError("Unknown task: %s" % name)
+    if user is not None and user.is_anonymous:
+        user = None
+    prune_outputs()
+    params = json.dumps(params, sort_keys=True)
+    if reuse:
+        job = find_job(name, user, params)
+        if job is not None:
+            db.session.commit()
+            return job
+    job = Job(
+        name=name,
+        params=params,
+        max_attempts=TASKS[name][1],
+        user_id=user.id if user else None,
+    )
+    job.save()
+    get_backend().enqueue(job)
+    return job
+
+
+def output_expired_at():
+    """Return the time before which generated files are outdated."""
+    return dt.datetime.utcnow() - dt.timedelta(
+        seconds=current_app.config['JOB_OUTPUT_EXPIRY'])
+
+
+def prune_outputs():
+    """Clear the files generated by jobs which have expired."""
+    Job.query.filter(
+        Job.output.isnot(None), Job.finished_at < output_expired_at()
+    ).update({'output': None}, synchronize_session=False)
+
+
+def find_job(name, user, params):
+    """Return a pending or recent job with the same request, if any."""
+    return Job.query.filter(
+        Job.name == name,
+        Job.params == params,
+        Job.user_id == (user.id if user else None),
+        or_(
+            Job.status.in_(['queued', 'running']),
+            and_(Job.status == 'done',
+                 Job.finished_at >= output_expired_at()),
+        )
+    ).order_by(Job.id.desc()).first()
+
+
+def run_job(job, retry=True):
+    """Run a claimed job, then record its outcome."""
+    job_id = job.id
+    job.status = 'running'
+    job.started_at = dt.datetime.utcnow()
+    job.attempts = (job.attempts or 0) + 1
+    job.save()
+    try:
+        if job.name not in TASKS:
+            raise JobError("Unknown task: %s" % job.name)
+        fn = TASKS[job.name][0]
+        result = fn(job, **json.loads(job.params or '{}'))
+        job.result = json.dumps(result)
+        job.error = None
+        job.status = 'done'
+    except Exception as ex:  # noqa: B902
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error = str(ex)
+        logging.warning("Job %d (%s) failed: %s", job.id, job.name, ex)
+        if retry and not isinstance(ex, JobError) \
+           and job.attempts < job.max_attempts:
+            # Exponential backoff before the next attempt
+            delay = current_app.config['JOB_RETRY_DELAY'] \
+                * 2 ** (job.attempts - 1)
+            job.run_at = dt.datetime.utcnow() + dt.timedelta(seconds=delay)
+            job.status = 'queued'
+        else:
+            job.status = 'failed'
+    job.finished_at = dt.datetime.utcnow()
+    job.save()
+    return job
+
+
+class DatabaseBackend(object):
+    """Jobs wait in the database for a worker."""
+
+    def enqueue(self, job):
+        """Nothing else to do, as the job is already saved."""
+        pass
+
+    def claim(self):
+        """Take the next job which is due, if any."""
+        now = dt.datetime.utcnow()
+        stale = now - dt.timedelta(seconds=JOB_LEASE)
+        ready = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.started_at < stale),
+        )
+        candidates = db.session.query(Job.id).filter(ready) \
+            .order_by(Job.run_at, Job.id).limit(10).all()
+        for (job_id,) in candidates:
+            # Conditional update, so that only one worker wins the job
+            claimed = Job.query.filter(Job.id == job_id, ready).update(
+                {'status': 'running', 'started_at': now},
+                synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+
+class ImmediateBackend(DatabaseBackend):
+    """Jobs run right away, in the current process."""
+
+    def enqueue(self, job):
+        """Run the job without retrying."""
+        run_job(job, retry=False)
+
+
+BACKENDS = {
+    'database': DatabaseBackend,
+    'immediate': ImmediateBackend,
+}
+
+
+def get_backend():
+    """Return the configured job backend."""
+    return BACKENDS[current_app.config['JOB_BACKEND']]()
+
+
+def work(once=False, interval=5):
+    """Process jobs from the queue, until stopped or drained."""
+    backend = get_backend()
+    count = 0
+    while True:
+        job = backend.claim()
+        if job is None:
+            if once:
+                return count
+            time.sleep(interval)
+            continue
+        job = run_job(job)
+        logging.info("Job %d (%s): %s", job.id, job.name, job.status)
+        count += 1
+
+
+# ------ TASKS ---------
+
+@task('project_autoupdate')
+def project_autoupdate_task(job, project_id):
+    """Sync remote project data."""
+    project = db.session.get(Project, project_id)
+    if project is None or not project.is_autoupdateable:
+        raise JobError("Project is not autoupdateable")
+    has_autotext = project.autotext and len(project.autotext) > 1
+    data = GetProjectData(project.autotext_url, project.commits_since,
+                          stream=True)
+    if not data or 'name' not in data:
+        raise Exception("To Sync: ensure a README on the remote site.")
+    SyncProjectData(project, data)
+    if has_autotext:
+        return {'message': "Project synced."}
+    if not project.autotext or len(project.autotext) < 2:
+        raise JobError("Could not sync: remote README is empty.")
+    if job.user:
+        ProjectActivity(project, 'update', job.user, action='sync',
+                        comments=str(len(project.autotext)) + ' bytes')
+    return {'message': "Thanks for contributing: %s synced." % data['type']}
+
+
+@task('event_autosync')
+def event_autosync_task(job, event_id):
+    """Sync all the projects of an event."""
+    event = db.session.get(Event, event_id)
+    if event is None:
+        raise JobError("Event not found")
+    return {'report': SyncEventProjects(event.projects)}
+
+
+@task('event_import', max_attempts=1)
+def event_import_task(job, data, dry_run=True, all_data=False):
+    """Load event data from a Data Package."""
+    results = import_event_package(data, dry_run, all_data)
+    if 'errors' in results:
+        raise JobError(', '.join(results['errors']))
+    counts = {k: len(v) for k, v in results.items()}
+    names = [r['name'] for r in results.get('events', [])]
+    return {'events': names, 'counts': counts}
+
+
+@task('event_package')
+def event_package_task(job, event_id, host_url=''):
+    """Create a zipped Data Package of an event."""
+    event = db.session.get(Event, event_id)
+    if event is None:
+        raise JobError("Event not found")
+    package = event_to_data_package(event, job.user, host_url, True)
+    filename = "datapackage-%s.zip" % event.name.lower().strip()
+    with tempfile.NamedTemporaryFile(suffix='.zip') as fp_package:
+        package.to_zip(fp_package.name)
+        with open(fp_package.name, 'rb') as fp_zip:
+            job.output = fp_zip.read()
+    return {'filename': filename}
@@ -2,15 +2,22 @@
 """Jinja formatters for Oneboxes and Embeds."""
 
 import re
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask import url_for
-from micawber.parsers import standalone_url_re, full_handler
-from .boxout.ckan import box_dataset, chk_dataset, ini_dataset
+from micawber.parsers import full_handler
+from .boxout.ckan import box_dataset, ini_dataset
 from .boxout.dribdat import box_project
-from .boxout.datapackage import box_datapackage, chk_datapackage
+from .boxout.datapackage import box_datapackage
 from .boxout.github import box_repo
 from dribdat.extensions import cache
 
+OEMBED_WORKERS = 4  # concurrent provider requests per document
+OEMBED_BUDGET = 5  # seconds to wait for all the providers of a document
+OEMBED_TIMEOUT = 3600  # seconds a resolved box is kept
+OEMBED_FAIL_TIMEOUT = 3600  # seconds until a failed URL is tried again
+
 
 def format_webembed(project_id, url=None):
     """Create a well-formatted frame for project embeds."""
@@ -52,7 +59,7 @@ def repl_onebox(mat=None, li=[]):
         url = mat.group(1).strip()
         if '/project/' in url:
             # Try to parse a project link
-            return box_project(url) or mat.group()
+            return box_project(url, cache) or mat.group()
     return mat.group()
 
 
@@ -63,43 +70,6 @@ def make_onebox(raw_html):
     return re.sub(regexp, repl_onebox, raw_html)
 
 
-def make_oembedplus(text, oembed_providers, **params):
-    """Check for additional onebox lines."""
-    lines = text.splitlines()
-    parsed = []
-    has_dataset = False
-    # Url to projects
-    home_url = re.escape(url_for('public.home', _external=True) + 'project/')
-    home_url_re = re.compile('(%s.+)' % home_url)
-    # Iterate each line (inefficient!)
-    for line in lines:
-        newline = None
-        if home_url_re.match(line):
-            # Parse an internal project
-            newline = re.sub(home_url_re, repl_onebox, line)
-        elif chk_datapackage(line):
-            # Try to parse a Data Package link
-            newline = box_datapackage(line, cache)
-        elif chk_dataset(line):
-            # Try to render a CKAN dataset link
-            newline = box_dataset(line)
-            has_dataset = has_dataset or newline is not None
-        #elif line.startswith('https://github.com/'):
-            # Try to parse a GitHub link
-        #    newline = box_repo(line)
-        elif standalone_url_re.match(line):
-            # Check for out of box providers
-            newline = box_default(line, oembed_providers, **params)
-        # Do we have parse?
-        if newline is not None:
-            line = newline
-        parsed.append(line)
-    # Add init code
-    if has_dataset:
-        parsed = [ini_dataset()] + parsed
-    return '\n'.join(parsed)
-
-
 def box_default(line, oembed_providers, **params):
     """Fetch a built-in provider box."""
     url = line.strip()
@@ -110,3 +80,106 @@ def box_default(line, oembed_providers, **params):
     else:
         return full_handler(url, response, **params)
     return None
+
+
+def oembed_key(url):
+    """Return the cache key of the box of a URL."""
+    return 'oembed/%s' % hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def box_defaults(urls, oembed_providers, **params):
+    """Fetch built-in provider boxes in parallel, within a time budget."""
+    boxes = {}
+    pending = []
+    for url in urls:
+        if oembed_providers.provider_for_url(url) is None:
+            continue
+        hit = cache.get(oembed_key(url))
+        if hit is None:
+            pending.append(url)
+        else:
+            # Failures are kept as empty boxes, so not tried again
+            boxes[url] = hit or None
+    if not pending:
+        return boxes
+    pool = ThreadPoolExecutor(max_workers=min(OEMBED_WORKERS, len(pending)))
+    futures = {
+        pool.submit(box_default, url, oembed_providers, **params): url
+        for url in pending
+    }
+    done, not_done = wait(futures, timeout=OEMBED_BUDGET)
+    # Do not hold up the page for slow providers
+    pool.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        url = futures[future]
+        try:
+            boxes[url] = future.result()
+        except Exception:  # noqa: B902
+            logging.info("OEmbed could not render: <%s>" % url)
+            boxes[url] = None
+        if boxes[url] is None:
+            cache.set(oembed_key(url), '', timeout=OEMBED_FAIL_TIMEOUT)
+        else:
+            cache.set(oembed_key(url), boxes[url], timeout=OEMBED_TIMEOUT)
+    for future in not_done:
+        logging.info("OEmbed timed out: <%s>" % futures[future])
+    return boxes
+
+
+class OneboxEngine(object):
+    """Render all the Oneboxes of a document in a single pass."""
+
+    def __init__(self, oembed_providers, **params):
+        """Keep the providers for the embeds of every document."""
+        self.oembed_providers = oembed_providers
+        self.params = params
+
+    def compile(self, home_url):
+        """Build the patterns, which depend on the address of this server."""
+        home = re.escape(home_url)
+        # One alternative per kind of line, in order of precedence
+        return re.compile('|'.join([
+            r'^(?P<project>%sproject/.+)$' % home,
+            r'^(?P<datapackage>http.*datapackage\.json'
+            r'|.*datapackage\.json\))$',
+            r'^(?P<dataset>http.*/dataset/.*)$',
+            r'^[^\S\n]*(?P<embed>https?://[-A-Za-z0-9+&@#/%?=~_()|!:,.;]*'
+            r'[-A-Za-z0-9+&@#/%=~_|])[^\S\n]*$',
+        ]), re.MULTILINE)
+
+    def render(self, text):
+        """Replace the lines of a document which can be boxed."""
+        # The address comes from the request, compiled patterns are
+        # kept by the re module
+        line_re = self.compile(url_for('public.home', _external=True))
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        parsed = []
+        embeds = {}
+        has_dataset = False
+        pos = 0
+        for mat in line_re.finditer(text):
+            parsed.append(text[pos:mat.start()])
+            pos = mat.end()
+            line = mat.group()
+            newline = None
+            if mat.lastgroup == 'project':
+                newline = box_project(line.strip(), cache)
+            elif mat.lastgroup == 'datapackage':
+                newline = box_datapackage(line, cache)
+            elif mat.lastgroup == 'dataset':
+                newline = box_dataset(line)
+                has_dataset = has_dataset or newline is not None
+            elif mat.lastgroup == 'embed':
+                embeds[len(parsed)] = mat.group('embed')
+            parsed.append(line if newline is None else newline)
+        parsed.append(text[pos:])
+        # Replace links which could be resolved, others remain as they are
+        boxes = box_defaults(
+            set(embeds.values()), self.oembed_providers, **self.params)
+        for ix, url in embeds.items():
+            if boxes.get(url) is not None:
+                parsed[ix] = boxes[url]
+        # Add init code
+        if has_dataset:
+            parsed.insert(0, ini_dataset() + '\n')
+        return ''.join(parsed)
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """API calls for dribdat."""
+import io
+import json
 import boto3
-import tempfile
 import datetime as dt
 
 from flask import (
@@ -11,29 +12,37 @@ from flask import (
     jsonify, flash, url_for
 )
 from flask_login import login_required, current_user
-from sqlalchemy import or_
 from markupsafe import escape
 
 from ..extensions import db, cache
 from ..utils import timesince, random_password, sanitize_url
 from ..decorators import admin_required
-from ..user.models import Event, Project, Activity, User
+from ..user.models import Event, Project, Activity, User, Job
 from ..apipackage import import_event_package, event_to_data_package
+from ..search import search_projects
+from ..jobs import enqueue
 from ..aggregation import (
     AddProjectDataFromAutotext,
     GetProjectData, 
-    GetEventUsers,
+    QueryEventUsers,
 )
 from ..apiutils import (
-    get_project_list,
+    get_projects_by_event,
+    iter_project_list,
+    iter_project_summaries,
+    project_cursor,
+    parse_project_cursor,
     get_event_activities,
+    iter_event_activities,
     get_schema_for_user_projects,
     event_upload_configuration,
     expand_project_urls,
-    gen_csv,
+    iter_batches,
+    stream_csv,
+    stream_json,
 )
 from ..apipackage import (
-    fetch_datapackage, import_datapackage, import_projects_csv
+    fetch_datapackage, import_projects_csv
 )
 
 blueprint = Blueprint('api', __name__, url_prefix='/api')
@@ -68,11 +77,29 @@ def info_event_hackathon_json(event_id):
 
 # ------ EVENT PROJECTS ---------
 
-def request_project_list(event_id):
-    """Fetch a project list."""
+def request_project_stream(event_id):
+    """Stream a project list."""
     is_moar = bool(request.args.get('moar', type=bool))
     host_url = request.host_url
-    return get_project_list(event_id, host_url, is_moar)
+    return iter_project_list(event_id, host_url, is_moar)
+
+
+def project_list_response(projects, **fields):
+    """Stream JSON of a project query, paginated with limit and cursor."""
+    is_moar = bool(request.args.get('moar', type=bool))
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(limit, 1)
+    try:
+        cursor = parse_project_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify(message="Invalid cursor"), 400
+    projectlist = iter_project_summaries(
+        projects, request.host_url, is_moar, cursor, limit)
+    jsonstream = stream_json(
+        'projects', projectlist, limit, project_cursor, **fields)
+    return Response(stream_with_context(jsonstream),
+                    mimetype='application/json')
 
 
 @blueprint.route('/event/current/projects.json')
@@ -80,13 +107,14 @@ def project_list_current_json():
     """Output JSON of projects in the current event with its info."""
     event = Event.query.filter_by(is_current=True).first() or \
         Event.query.order_by(Event.id.desc()).first_or_404()
-    return jsonify(projects=request_project_list(event.id), event=event.data)
+    return project_list_response(
+        get_projects_by_event(event.id), event=event.data)
 
 
 @blueprint.route('/event/<int:event_id>/projects.json')
 def project_list_json(event_id):
     """Output JSON of all projects at a specific event."""
-    return jsonify(projects=request_project_list(event_id))
+    return project_list_response(get_projects_by_event(event_id))
 
 
 def project_list_csv(event_id, event_name):
@@ -95,7 +123,7 @@ def project_list_csv(event_id, event_name):
         'Content-Disposition': 'attachment; filename='
         + event_name + '_projects_dribdat.csv'
     }
-    csvlist = gen_csv(request_project_list(event_id))
+    csvlist = stream_csv(request_project_stream(event_id))
     return Response(stream_with_context(csvlist),
                     mimetype='text/csv',
                     headers=headers)
@@ -127,7 +155,7 @@ def list_all_events(as_format='json'):
     if as_format == 'json':
         return jsonify(events=eventlist)
     headers = {'Content-Disposition': 'attachment; filename=events.csv'}
-    csvlist = gen_csv(eventlist)
+    csvlist = stream_csv(eventlist)
     return Response(stream_with_context(csvlist),
                     mimetype='text/csv',
                     headers=headers)
@@ -136,17 +164,28 @@ def list_all_events(as_format='json'):
 @blueprint.route('/events/projects.csv')
 def project_list_all_events_csv():
     """Output CSV of projects and challenges in all events."""
-    projectlist = []
-    export = Event.query.filter_by(is_hidden=False, lock_resources=False).all()
-    for event in export:
-        projectlist.extend(request_project_list(event.id))
+    export = Event.query.filter_by(is_hidden=False, lock_resources=False) \
+        .with_entities(Event.id).all()
+    projectlist = (
+        p for (event_id,) in export for p in request_project_stream(event_id)
+    )
     headers = {'Content-Disposition': 'attachment; filename=projects.csv'}
-    csvlist = gen_csv(projectlist)
+    csvlist = stream_csv(projectlist)
     return Response(stream_with_context(csvlist),
                     mimetype='text/csv',
                     headers=headers)
 
 
+@blueprint.route('/events/projects.json')
+def project_list_all_events_json():
+    """Output JSON of projects and challenges in all events."""
+    export = db.select(Event.id).filter_by(
+        is_hidden=False, lock_resources=False)
+    projects = Project.query.filter_by(is_hidden=False) \
+        .filter(Project.event_id.in_(export))
+    return project_list_response(projects)
+
+
 @blueprint.route('/event/current/categories.json')
 def categories_list_current_json():
     """Output JSON of categories in the current event."""
@@ -157,14 +196,45 @@ def categories_list_current_json():
 # ------ ACTIVITY FEEDS ---------
 
 
-@blueprint.route('/event/<int:event_id>/activity.json')
-def event_activity_json(event_id):
-    """Output JSON of recent activity in an event."""
-    limit = request.args.get('limit') or 50
+def request_activity_filters():
+    """Read the filters and cursors of an activity feed from the query."""
+    filters = {
+        'name': request.args.get('name') or None,
+        'action': request.args.get('action') or None,
+        'user_id': request.args.get('user', type=int),
+        'project_id': request.args.get('project', type=int),
+        'before_id': request.args.get('before_id', type=int),
+        'after_id': request.args.get('after_id', type=int),
+    }
+    if filters['name'] is not None and \
+            filters['name'] not in Activity.name.type.enums:
+        raise ValueError("Unknown activity: %s" % filters['name'])
+    return filters
+
+
+def activity_list_response(event_id=None, limit=50, action=None):
+    """Output a page of activities, with the cursor of the next one."""
+    limit = request.args.get('limit', type=int) or limit
     q = request.args.get('q') or None
     if q and len(q) < 3:
         q = None
-    return jsonify(activities=get_event_activities(event_id, limit, q))
+    try:
+        filters = request_activity_filters()
+    except ValueError as ex:
+        return jsonify(message=str(ex)), 400
+    if action is not None:
+        filters['action'] = action
+    activities = get_event_activities(event_id, limit, q, **filters)
+    # Older activities follow, unless this page was not full
+    more = len(activities) == limit and filters['after_id'] is None
+    return jsonify(activities=activities,
+                   next=activities[-1]['id'] if more else None)
+
+
+@blueprint.route('/event/<int:event_id>/activity.json')
+def event_activity_json(event_id):
+    """Output JSON of recent activity in an event."""
+    return activity_list_response(event_id, 50)
 
 
 @blueprint.route('/event/current/activity.json')
@@ -183,7 +253,13 @@ def event_activity_csv(event_id):
     q = request.args.get('q') or None
     if q and len(q) < 3:
         q = None
-    csvstream = gen_csv(get_event_activities(event_id, limit, q))
+    try:
+        filters = request_activity_filters()
+    except ValueError as ex:
+        return jsonify(message=str(ex)), 400
+    del filters['after_id']
+    activities = iter_event_activities(event_id, limit, q, **filters)
+    csvstream = stream_csv(activities)
     headers = {'Content-Disposition': 'attachment; filename=activity_list.csv'}
     return Response(stream_with_context(csvstream),
                     mimetype='text/csv', headers=headers)
@@ -192,21 +268,13 @@ def event_activity_csv(event_id):
 @blueprint.route('/project/activity.json')
 def projects_activity_json():
     """Output JSON of recent activity across all projects."""
-    limit = request.args.get('limit') or 10
-    q = request.args.get('q') or None
-    if q and len(q) < 3:
-        q = None
-    return jsonify(activities=get_event_activities(None, limit, q))
+    return activity_list_response(None, 10)
 
 
 @blueprint.route('/project/posts.json')
 def projects_posts_json():
     """Output JSON of recent posts (activity) across projects."""
-    limit = request.args.get('limit') or 10
-    q = request.args.get('q') or None
-    if q and len(q) < 3:
-        q = None
-    return jsonify(activities=get_event_activities(None, limit, q, "post"))
+    return activity_list_response(None, 10, "post")
 
 
 @blueprint.route('/project/top.json')
@@ -277,12 +345,13 @@ def project_info_json(project_id):
 def event_participants_csv(event_id):
     """Download a CSV of event participants."""
     event = Event.query.filter_by(id=event_id).first_or_404()
-    userlist = [u.data for u in GetEventUsers(event)]
+    users = QueryEventUsers(event)
+    userlist = (u.data for batch in iter_batches(users) for u in batch)
     headers = {
         'Content-Disposition': 'attachment; '
         + 'filename=user_list_%d.csv' % event.id
     }
-    return Response(stream_with_context(gen_csv(userlist)),
+    return Response(stream_with_context(stream_csv(userlist)),
                     mimetype='text/csv',
                     headers=headers)
 
@@ -295,19 +364,13 @@ def project_search_json():
     q = request.args.get('q')
     if q is None or len(q) < 3:
         return jsonify(projects=[])
-    limit = request.args.get('limit') or 10
-    q = "%%%s%%" % q
-    projects = Project.query.filter(or_(
-        Project.name.like(q),
-        Project.summary.like(q),
-        Project.longtext.like(q),
-        Project.autotext.like(q),
-    )).limit(limit).all()
-    projects = expand_project_urls(
-        [p.data for p in projects],
-        request.host_url
-    )
-    return jsonify(projects=projects)
+    limit = min(request.args.get('limit', type=int) or 10, 100)
+    page = request.args.get('page', type=int) or 1
+    event_id = request.args.get('event', type=int)
+    category_id = request.args.get('category', type=int)
+    total, projects = search_projects(q, event_id, category_id, page, limit)
+    projects = expand_project_urls(projects, request.host_url)
+    return jsonify(projects=projects, total=total, page=page)
 
 # ------ UPDATE ---------
 
@@ -327,14 +390,20 @@ def event_upload_datapackage():
     if 'datapackage.json' not in filedata.filename:
         return jsonify(status='Error', errors=['Must be a datapackage.json'])
     # File handling
-    results = import_datapackage(filedata, dry_run, all_data)
-    event_names = ', '.join([r['name'] for r in results['events']])
-    if 'errors' in results:
-        return jsonify(status='Error', errors=results['errors'])
-    else:
+    try:
+        data = json.load(filedata)
+    except ValueError:
+        return jsonify(status='Error', errors=['Could not load package due to JSON error'])
+    job = enqueue('event_import', current_user,
+                  data=data, dry_run=dry_run, all_data=all_data)
+    if job.status == 'failed':
+        return jsonify(status='Error', errors=[job.error])
+    elif job.status == 'done':
+        event_names = ', '.join(job.data['result']['events'])
         flash("Events uploaded: %s" % event_names, 'success')
-        return redirect(url_for("admin.events"))
-    return jsonify(status=status, results=results)
+    else:
+        flash("%s import has been scheduled (job %d)." % (status, job.id), 'info')
+    return redirect(url_for("admin.events"))
 
 
 @blueprint.route('/event/push/datapackage', methods=["PUT", "POST"])
@@ -541,24 +610,31 @@ def generate_event_package(event, format='json'):
     """Create a Data Package from the data of an event."""
     if format not in ['zip', 'json']:
         return "Format not supported"
-    full_contents = (format == 'zip')
     host_url = request.host_url
-    # current_user can be empty or anonymous
-    package = event_to_data_package(event, current_user, host_url, full_contents)
     if format == 'json':
+        # current_user can be empty or anonymous
+        package = event_to_data_package(event, current_user, host_url, False)
         # Generate JSON representation
         return jsonify(package)
     elif format == 'zip':
-        # Build a file reference
-        filename = "datapackage-%s-" % event.name.lower().strip()
-        # Generate data package file
-        fp_package = tempfile.NamedTemporaryFile(
-            prefix=filename, suffix='.zip')
-        package.to_zip(fp_package.name)
-        return send_file(fp_package.name, as_attachment=True)
+        # Generate data package file in the background
+        job = enqueue('event_package', current_user, reuse=True,
+                      event_id=event.id, host_url=host_url)
+        if job.status == 'done':
+            return job_download(job.token)
+        elif job.status == 'failed':
+            return job_response(job), 500
+        return job_response(job), 202
+
+
+def is_package_data(rv):
+    """Only cache the JSON packages, not the jobs or their files."""
+    return not isinstance(rv, tuple) \
+        and getattr(rv, 'mimetype', None) == 'application/json'
+
 
 @blueprint.route('/event/current/datapackage.<format>', methods=["GET"])
-@cache.cached()
+@cache.cached(response_filter=is_package_data)
 def package_current_event(format):
     """Download a Data Package for an event."""
     event = Event.query.filter_by(is_current=True).first() or \
@@ -567,13 +643,47 @@ def package_current_event(format):
 
 
 @blueprint.route('/event/<int:event_id>/datapackage.<format>', methods=["GET"])
-@cache.cached()
+@cache.cached(response_filter=is_package_data)
 def package_specific_event(event_id, format):
     """Download a Data Package for an event."""
     event = Event.query.filter_by(id=event_id).first_or_404()
     return generate_event_package(event, format)
 
 
+# ------ JOBS API --------
+
+def job_response(job):
+    """Describe a job, with links to follow up on it."""
+    data = job.data
+    data['url'] = url_for('api.job_status', token=job.token, _external=True)
+    if job.output is not None:
+        data['download_url'] = url_for(
+            'api.job_download', token=job.token, _external=True)
+    return jsonify(job=data)
+
+
+@blueprint.route('/jobs/<token>', methods=["GET"])
+def job_status(token):
+    """Check on the progress of a background job."""
+    job = Job.query.filter_by(token=token).first_or_404()
+    if not job.may_view(current_user):
+        return jsonify(status='Error', errors=['Access denied']), 403
+    return job_response(job)
+
+
+@blueprint.route('/jobs/<token>/download', methods=["GET"])
+def job_download(token):
+    """Download the file generated by a background job."""
+    job = Job.query.filter_by(token=token).first_or_404()
+    if not job.may_view(current_user):
+        return jsonify(status='Error', errors=['Access denied']), 403
+    if job.output is None:
+        return jsonify(status='Error', errors=['No output available']), 404
+    filename = json.loads(job.result)['filename']
+    return send_file(io.BytesIO(job.output), as_attachment=True,
+                     download_name=filename)
+
+
 # ------ USER API --------
 
 
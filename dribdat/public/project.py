@@ -12,7 +12,7 @@ from dribdat.public.forms import (
     ProjectNew, ProjectPost, ProjectBoost, ProjectComment
 )
 from dribdat.aggregation import (
-    SyncProjectData, GetProjectData, AllowProjectEdit
+    AllowProjectEdit
 )
 from dribdat.user import (
     validateProjectData, stageProjectToNext, isUserActive,
@@ -23,6 +23,7 @@ from dribdat.public.projhelper import (
 )
 from ..decorators import admin_required
 from ..mailer import user_invitation
+from ..jobs import enqueue
 
 blueprint = Blueprint('project', __name__,
                       static_folder="../static", url_prefix='/project')
@@ -474,9 +475,6 @@ def project_autoupdate(project_id):
         flash('You may not sync this project.', 'warning')
         return redirect(url_for('project.project_view', project_id=project_id))
 
-    # Check if we already have content
-    has_autotext = project.autotext and len(project.autotext) > 1
-
     # Instruct user about certain links
     if project.autotext_url.startswith('https://docs.google.com/document') and \
        (project.autotext_url.endswith('/edit') or \
@@ -485,22 +483,15 @@ def project_autoupdate(project_id):
         return redirect(url_for('project.project_view', project_id=project_id))
 
     # Start update process
-    data = GetProjectData(project.autotext_url)
-    if not data or 'name' not in data:
-        flash("To Sync: ensure a README on the remote site.", 'warning')
-        return redirect(url_for('project.project_view', project_id=project_id))
-
-    # Transfer the project fields
-    SyncProjectData(project, data)
+    job = enqueue('project_autoupdate', current_user, project_id=project.id)
 
     # Confirmation messages
-    if not has_autotext:
-        if project.autotext and len(project.autotext) > 1:
-            project_action(project.id, 'update', action='sync',
-                           text=str(len(project.autotext)) + ' bytes')
-            flash("Thanks for contributing: %s synced." % data['type'], 'success')
-        else:
-            flash("Could not sync: remote README is empty.", 'warning')
+    if job.status == 'done':
+        flash(job.data['result']['message'], 'success')
+    elif job.status == 'failed':
+        flash(job.error, 'warning')
+    else:
+        flash("Sync has been scheduled, please check back soon.", 'info')
     return redirect(url_for(
         'project.project_view', project_id=project_id))
 
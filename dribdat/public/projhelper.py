@@ -6,6 +6,7 @@ from flask import (
 from flask_login import current_user
 from urllib.parse import quote, quote_plus
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from dribdat.user.models import Event, Project
 from dribdat.public.forms import (
     ProjectForm, ProjectDetailForm,
@@ -36,14 +37,12 @@ def resources_by_stage(progress, resource_event=False):
     if resource_event:
         # No need to make suggestions in a Resource event
         return []
-    project_list = []
     resource_events = [e.id for e in Event.query.filter_by(
         lock_resources=True, is_hidden=False).all()]
-    for eid in resource_events:
-        projects = Project.query.filter_by(
-            event_id=eid, is_hidden=False, progress=progress)
-        project_list.extend([p.data for p in projects.all()])
-    return project_list
+    projects = Project.query.filter(Project.event_id.in_(resource_events)) \
+        .filter_by(is_hidden=False, progress=progress) \
+        .order_by(Project.event_id, Project.id)
+    return Project.bulk_data(projects)
 
 
 def templates_from_event(resource_event=False):
@@ -51,14 +50,12 @@ def templates_from_event(resource_event=False):
     if resource_event:
         # No need to make suggestions in a Resource event
         return []
-    project_list = []
     template_events = [e.id for e in Event.query.filter_by(
         lock_templates=True).all()]
-    for eid in template_events:
-        projects = Project.query.filter_by(
-            event_id=eid, is_hidden=False)
-        project_list.extend([p.data for p in projects.all()])
-    return project_list
+    projects = Project.query.filter(Project.event_id.in_(template_events)) \
+        .filter_by(is_hidden=False) \
+        .order_by(Project.event_id, Project.id)
+    return Project.bulk_data(projects)
 
 
 def project_edit_action(project_id, detail_view=False):
@@ -144,11 +141,13 @@ def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
     # Check type of project
     if event.lock_resources:
         project_dribs = project_badge = []
+        dribs_next = None
         project_team = None
         missing_roles = None
     else:
         # Collect dribs and badges
-        project_dribs = project.all_dribs()
+        project_dribs, dribs_next = project.timeline(
+            request.args.get('before_id', type=int))
         project_badge = [s for s in project_dribs if s['name'] == 'boost']
         # Obtain list of team members (performance!)
         project_team = project.get_team()
@@ -190,6 +189,7 @@ def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
         'public/project.html', current_event=event, project=project,
         project_starred=starred, project_team=project_team,
         project_badge=project_badge, project_dribs=project_dribs,
+        dribs_next=dribs_next,
         project_image_url=project_image_url, go_nav=go_nav,
         allow_edit=allow_edit, allow_post=allow_post,
         lock_editing=lock_editing, missing_roles=missing_roles,
@@ -211,31 +211,33 @@ def revert_project_by_activity(project, activity):
 
 def navigate_around_project(project, as_challenge=False):
     """Returns previous and next projects in the default order."""
-    go_nav = {}
     # Sort visible projects by identity (if used), or alphabetically
-    projects = Project.query \
-        .filter_by(event_id=project.event_id, is_hidden=False) \
-        .order_by(Project.ident, Project.name)
-        # The above must match views->event
-    p_prev = p_next = p_found = None
-    for p in projects:
-        if p_found:
-            p_next = p
-            break
-        elif p.id == project.id:
-            p_found = True
-        else:
-            p_prev = p
-    if p_prev:
-        go_nav['prev'] = p_prev.data
-        go_nav['prev']['url'] = '/' + p_prev.url
-        if as_challenge:
-            go_nav['prev']['url'] = '/' + p_prev.url + '/challenge'
-    if p_next:
-        go_nav['next'] = p_next.data
-        go_nav['next']['url'] = '/' + p_next.url
-        if as_challenge:
-            go_nav['next']['url'] = '/' + p_next.url + '/challenge'
-    elif not p_prev:
+    order = (Project.ident, Project.name, Project.id)
+    # The above must match views->event
+    ordered = db.session.query(
+        Project.id,
+        func.lag(Project.id).over(order_by=order).label('prev_id'),
+        func.lag(Project.name).over(order_by=order).label('prev_name'),
+        func.lead(Project.id).over(order_by=order).label('next_id'),
+        func.lead(Project.name).over(order_by=order).label('next_name'),
+    ).filter_by(event_id=project.event_id, is_hidden=False).subquery()
+    around = db.session.query(ordered) \
+        .filter(ordered.c.id == project.id).first()
+    if around is None or (around.prev_id is None and around.next_id is None):
         return None
-    return go_nav
\ No newline at end of file
+    go_nav = {}
+    endpoint = 'project.get_challenge' if as_challenge \
+        else 'project.project_view'
+    if around.prev_id is not None:
+        go_nav['prev'] = {
+            'id': around.prev_id,
+            'name': around.prev_name,
+            'url': url_for(endpoint, project_id=around.prev_id),
+        }
+    if around.next_id is not None:
+        go_nav['next'] = {
+            'id': around.next_id,
+            'name': around.next_name,
+            'url': url_for(endpoint, project_id=around.next_id),
+        }
+    return go_nav
@@ -2,17 +2,19 @@
 """Public section, including homepage and signup."""
 from dribdat.utils import load_event_presets
 from flask import (Blueprint, request, render_template, flash, url_for,
-                   redirect, current_app, jsonify)
+                   redirect, current_app, jsonify, abort)
 from flask_login import login_required, current_user
 from dribdat.user.models import User, Event, Project, Activity
 from dribdat.public.forms import NewEventForm
 from dribdat.database import db
 from dribdat.extensions import cache
 from dribdat.aggregation import GetEventUsers
+from dribdat.apiutils import filter_activities, page_activities
 from dribdat.user import getProjectStages, isUserActive
 from urllib.parse import quote, quote_plus, urlparse
 from datetime import datetime
 from sqlalchemy import and_, or_
+from types import SimpleNamespace
 import re
 
 blueprint = Blueprint('public', __name__, static_folder="../static")
@@ -196,14 +198,13 @@ def event(event_id):
     # Sort visible projects by identity (if used), or alphabetically
     projects = Project.query \
         .filter_by(event_id=event_id, is_hidden=False) \
-        .order_by(Project.ident, Project.name)
+        .order_by(Project.ident, Project.name, Project.id)
         # The above must match projhelper->navigate_around_project
     # Embedding view
     if request.args.get('embed'):
         return render_template("public/embed.html",
                                current_event=event, projects=projects)
-    # TODO: seems inefficient? We only need a subset of the data here:
-    summaries = [ p.data for p in projects ]
+    summaries = Project.bulk_data(projects)
     return render_template("public/event.html", current_event=event,
                            summaries=summaries, project_count=len(summaries),
                            active="projects")
@@ -294,12 +295,13 @@ def event_stages(event_id):
         s['projects'] = []  # Reset the index
     projects = Project.query.filter_by(event_id=event.id, is_hidden=False) \
                             .order_by(Project.ident, Project.name)
+    by_stage = {}
+    for p in Project.bulk_data(projects):
+        by_stage.setdefault(p['progress'], []).append(p)
     for s in steps:
         if 'projects' not in s:
             s['projects'] = []
-        project_list = [p.data for p in projects.filter_by(
-            progress=s['id']).all()]
-        s['projects'].extend(project_list)
+        s['projects'].extend(by_stage.get(s['id'], []))
     return render_template("public/eventstages.html",
                            current_event=event, steps=steps, active="stages")
 
@@ -328,13 +330,15 @@ def event_challenges(event_id):
     """Show all the challenges of an event."""
     event = Event.query.filter_by(id=event_id).first_or_404()
     projects = Project.query.filter_by(event_id=event.id, is_hidden=False) \
-                            .order_by(Project.ident, Project.name)
+                            .order_by(Project.ident, Project.name, Project.id)
     if not current_user or current_user.is_anonymous or not current_user.is_admin:
         projects = projects.filter(Project.progress >= 0)
-    challenges = [ p.as_challenge() for p in projects ]
+    projects = projects.all()
+    snapshots = Project.challenge_snapshots(event.id, projects)
+    challenges = [snapshots[p.id] for p in projects]
     return render_template("public/eventchallenges.html",
                            current_event=event, projects=challenges,
-                           project_count=projects.count(),
+                           project_count=len(projects),
                            active="challenges")
 
 
@@ -415,15 +419,37 @@ def clear_cache():
 @blueprint.route("/dribs")
 def dribs():
     """Show the latest logged posts."""
-    page = int(request.args.get('page') or 1)
     per_page = int(request.args.get('limit') or 10)
+    before_id = request.args.get('before_id', type=int)
+    filters = {
+        'name': request.args.get('name') or None,
+        'action': request.args.get('action') or None,
+        'user_id': request.args.get('user', type=int),
+        'project_id': request.args.get('project', type=int),
+    }
+    if filters['name'] is not None and \
+            filters['name'] not in Activity.name.type.enums:
+        abort(400)
     latest_dribs = Activity.query.filter(or_(
         Activity.action == "post",
-        Activity.name == "boost")).order_by(Activity.id.desc())
-    dribs = latest_dribs.paginate(page=page, per_page=per_page)
-    dribs.items = [
-        d for d in dribs.items
-        if not d.project.is_hidden and d.content]
+        Activity.name == "boost")) \
+        .join(Project, Activity.project_id == Project.id) \
+        .filter(Project.is_hidden.isnot(True)) \
+        .filter(Activity.content.isnot(None), Activity.content != '')
+    latest_dribs = filter_activities(latest_dribs, **filters)
+    # One more than needed, to know if there is another page
+    items = page_activities(latest_dribs, per_page + 1, before_id)
+    dribs = SimpleNamespace(
+        items=items[:per_page], has_next=len(items) > per_page)
+    if dribs.has_next:
+        dribs.next_args = {
+            'before_id': dribs.items[-1].id,
+            'limit': request.args.get('limit'),
+            'name': filters['name'],
+            'action': filters['action'],
+            'user': filters['user_id'],
+            'project': filters['project_id'],
+        }
     # Generate social links
     for d in dribs.items:
         d.share = {
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Full text search of projects."""
+# The index is maintained by the database itself, so that every change
+# (form edits, autoupdate via SyncProjectData, imports) is searchable:
+# - PostgreSQL: a generated tsvector column with a GIN index
+# - SQLite: an external content FTS5 table kept in sync by triggers
+# Any other backend falls back to a plain LIKE scan.
+
+from markupsafe import escape
+from sqlalchemy import DDL, event, func, literal_column, or_, text
+from sqlalchemy.sql import column, table
+
+from dribdat.database import db
+from dribdat.user.models import Project
+
+SEARCH_FIELDS = ['name', 'summary', 'longtext', 'autotext']
+SEARCH_CONFIG = 'simple'  # multilingual content, so no stemming
+SNIPPET_START = '<mark>'
+SNIPPET_STOP = '</mark>'
+# Placeholders around the matches, replaced after escaping the snippet
+MATCH_START = '\ue000'
+MATCH_STOP = '\ue001'
+
+# The available kind of index of each database engine
+_backends = {}
+
+# Migration 4c8d2a6f1e93 has its own copy: changes need a new migration
+PG_SEARCH_DDL = [
+    """
+    ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(summary, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(longtext, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(autotext, '')), 'D')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_projects_search_vector
+    ON projects USING GIN (search_vector)
+    """,
+]
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+        name, summary, longtext, autotext,
+        content='projects', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_ai AFTER INSERT ON projects
+    BEGIN
+        INSERT INTO projects_fts (rowid, name, summary, longtext, autotext)
+        VALUES (new.id, new.name, new.summary, new.longtext, new.autotext);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_ad AFTER DELETE ON projects
+    BEGIN
+        INSERT INTO projects_fts
+            (projects_fts, rowid, name, summary, longtext, autotext)
+        VALUES ('delete',
+            old.id, old.name, old.summary, old.longtext, old.autotext);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_au
+    AFTER UPDATE OF name, summary, longtext, autotext ON projects
+    BEGIN
+        INSERT INTO projects_fts
+            (projects_fts, rowid, name, summary, longtext, autotext)
+        VALUES ('delete',
+            old.id, old.name, old.summary, old.longtext, old.autotext);
+        INSERT INTO projects_fts (rowid, name, summary, longtext, autotext)
+        VALUES (new.id, new.name, new.summary, new.longtext, new.autotext);
+    END
+    """,
+    """
+    INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')
+    """,
+]
+
+# Set up the index along with the table (i.e. on db.create_all)
+for statement in PG_SEARCH_DDL:
+    event.listen(Project.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Project.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+
+
+def search_backend():
+    """Determine which kind of search index is available."""
+    bind = db.session.get_bind()
+    if bind not in _backends:
+        _backends[bind] = find_search_backend(bind)
+    return _backends[bind]
+
+
+def find_search_backend(bind):
+    """Look up the search index in the database."""
+    if bind.dialect.name == 'postgresql':
+        found = db.session.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'projects' AND column_name = 'search_vector'"
+        )).first()
+        return 'postgresql' if found else None
+    if bind.dialect.name == 'sqlite':
+        found = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'projects_fts'"
+        )).first()
+        return 'sqlite' if found else None
+    return None
+
+
+def fts_terms(q):
+    """Quote the words of a query as FTS5 prefix terms."""
+    words = [w.replace('"', '""') for w in q.split()]
+    return ' '.join('"%s"*' % w for w in words if w)
+
+
+def search_query_pg(q):
+    """Ranked search using the tsvector column, and a snippet."""
+    vector = literal_column('projects.search_vector')
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank(vector, tsquery)
+    snippet = func.ts_headline(
+        SEARCH_CONFIG,
+        func.concat_ws(' ', Project.summary, Project.longtext, Project.autotext),
+        tsquery,
+        'StartSel=%s, StopSel=%s, MaxWords=24, MinWords=8' % (
+            MATCH_START, MATCH_STOP)
+    )
+    query = db.session.query(Project.id, rank.label('rank')) \
+        .filter(vector.op('@@')(tsquery)) \
+        .order_by(rank.desc(), Project.id.desc())
+    return query, snippet
+
+
+def search_query_sqlite(q):
+    """Ranked search using the FTS5 table, and a snippet."""
+    fts = table('projects_fts', column('rowid'))
+    # Lower is better in bm25, with matches in the name weighing most
+    rank = literal_column('bm25(projects_fts, 10.0, 5.0, 1.0, 1.0)')
+    snippet = literal_column(
+        "snippet(projects_fts, -1, '%s', '%s', '...', 16)" % (
+            MATCH_START, MATCH_STOP))
+    query = db.session.query(Project.id, (-rank).label('rank')) \
+        .select_from(fts) \
+        .join(Project, Project.id == fts.c.rowid) \
+        .filter(text('projects_fts MATCH :terms')) \
+        .params(terms=fts_terms(q)) \
+        .order_by(rank, Project.id.desc())
+    return query, snippet
+
+
+def search_query_like(q):
+    """Unindexed search for other databases, and a snippet."""
+    like = "%%%s%%" % q
+    query = db.session.query(Project.id, literal_column('0').label('rank')) \
+        .filter(or_(
+            Project.name.like(like),
+            Project.summary.like(like),
+            Project.longtext.like(like),
+            Project.autotext.like(like),
+        )).order_by(Project.id.desc())
+    return query, Project.summary
+
+
+def format_snippet(snippet):
+    """Escape the text of a snippet, then highlight the matches."""
+    return str(escape(snippet or '')) \
+        .replace(MATCH_START, SNIPPET_START) \
+        .replace(MATCH_STOP, SNIPPET_STOP)
+
+
+def search_projects(q, event_id=None, category_id=None, page=1, per_page=10):
+    """Find visible projects, returning the total and a page of results."""
+    backend = search_backend()
+    if backend == 'postgresql':
+        query, snippet = search_query_pg(q)
+    elif backend == 'sqlite':
+        query, snippet = search_query_sqlite(q)
+        if not fts_terms(q):
+            return 0, []
+    else:
+        query, snippet = search_query_like(q)
+    query = query.filter(Project.is_hidden.isnot(True))
+    if event_id is not None:
+        query = query.filter(Project.event_id == event_id)
+    if category_id is not None:
+        query = query.filter(Project.category_id == category_id)
+    total = query.count()
+    page = max(page, 1)
+    hits = query.offset((page - 1) * per_page).limit(per_page).all()
+    if not hits:
+        return total, []
+    ids = [h.id for h in hits]
+    # Snippets are costly, so only made for the page of results
+    snippets = dict(query.filter(Project.id.in_(ids))
+                    .with_entities(Project.id, snippet).order_by(None))
+    projects = Project.bulk_load(Project.query.filter(Project.id.in_(ids)))
+    projects = {p.id: p for p in projects}
+    results = Project.bulk_data([projects[h.id] for h in hits])
+    for p, hit in zip(results, hits):
+        p['rank'] = float(hit.rank or 0)
+        p['snippet'] = format_snippet(snippets.get(hit.id))
+    return total, results
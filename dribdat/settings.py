@@ -60,6 +60,7 @@ class Config(object):
     DEBUG_TB_INTERCEPT_REDIRECTS = False
     CACHE_TYPE = 'SimpleCache'
     CACHE_NO_NULL_WARNING = True
+    RENDER_CACHE_TIMEOUT = int(os_env.get('RENDER_CACHE_TIMEOUT', 3600))  # sec
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Server settings
@@ -73,6 +74,30 @@ class Config(object):
     TIME_ZONE = os_env.get('TIME_ZONE', 'UTC')
     MAX_CONTENT_LENGTH = int(os_env.get('MAX_CONTENT_LENGTH', 1 * 1024 * 1024))
 
+    # Outbound requests: retries on 429/5xx with exponential backoff
+    HTTP_RETRIES = int(os_env.get('HTTP_RETRIES', 3))
+    HTTP_BACKOFF = float(os_env.get('HTTP_BACKOFF', 0.5))  # seconds
+    HTTP_POOL_SIZE = int(os_env.get('HTTP_POOL_SIZE', 10))  # per host
+
+    # Conditional request cache of remote fetches (blank folder: temp)
+    HTTP_CACHE = bool(strtobool(os_env.get('HTTP_CACHE', 'True')))
+    HTTP_CACHE_DIR = os_env.get('HTTP_CACHE_DIR', '')
+    HTTP_CACHE_SIZE = int(os_env.get('HTTP_CACHE_SIZE', 50))  # megabytes
+
+    # Background jobs: 'database', run with retries by the worker process
+    # which must be running (`python cli.py worker`, see the Procfile), or
+    # 'immediate' to run them once within the request
+    JOB_BACKEND = os_env.get('JOB_BACKEND', 'database')
+    JOB_RETRY_DELAY = int(os_env.get('JOB_RETRY_DELAY', 30))  # seconds
+    # Generated files are kept, and reused, for this long (seconds)
+    JOB_OUTPUT_EXPIRY = int(os_env.get('JOB_OUTPUT_EXPIRY', 3600))
+
+    # Instrumentation of database queries, logging slow requests (in ms)
+    SQL_STATS = bool(strtobool(os_env.get('SQL_STATS', 'False')))
+    SQL_SLOW_REQUEST = int(os_env.get('SQL_SLOW_REQUEST', 1000))
+    SQL_SLOW_QUERIES = int(os_env.get('SQL_SLOW_QUERIES', 100))
+    SQL_REPEAT_LIMIT = int(os_env.get('SQL_REPEAT_LIMIT', 10))  # N+1 check
+
     # Configure web analytics providers
     ANALYTICS_HREF = os_env.get('ANALYTICS_HREF', None)
     ANALYTICS_SIMPLE = os_env.get('ANALYTICS_SIMPLE', None)
@@ -127,6 +152,7 @@ class DevConfig(Config):
     DEBUG_TB_ENABLED = True # Enable the Debug Toolbar
     ASSETS_DEBUG = True  # Don't bundle/minify static assets
     WTF_CSRF_ENABLED = False  # Allows form testing
+    JOB_BACKEND = os_env.get('JOB_BACKEND', 'immediate')  # no worker needed
 
 
 class TestConfig(Config):
@@ -142,3 +168,4 @@ class TestConfig(Config):
     WTF_CSRF_ENABLED = False  # Allows form testing
     PRESERVE_CONTEXT_ON_EXCEPTION = False
     DRIBDAT_ALLOW_EVENTS = True # Allows anyone to create an event
+    JOB_BACKEND = 'immediate'  # Run jobs within the request
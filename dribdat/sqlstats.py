@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Opt-in instrumentation of the database queries made by requests."""
+# With SQL_STATS enabled, the statements of each request are counted and
+# timed. Responses get a Server-Timing header, and slow requests as well
+# as statements repeated in a loop (the N+1 pattern) are logged.
+
+import re
+import time
+from collections import Counter, defaultdict
+from functools import partial
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from dribdat.database import db
+
+# How many statements are shown in the log of a slow request
+TOP_STATEMENTS = 5
+
+# Lists of parameters, e.g. of IN clauses, are one shape whatever length
+RE_PARAMS = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)'
+                       r'(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+RE_SPACES = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Normalise a statement, so that repeated calls can be grouped."""
+    return RE_PARAMS.sub('(?)', RE_SPACES.sub(' ', statement).strip())
+
+
+class RequestStats(object):
+    """The statements executed while handling one request."""
+
+    def __init__(self):
+        """Start counting."""
+        self.started = time.monotonic()
+        self.queries = 0
+        self.duration = 0.0
+        self.counts = Counter()
+        self.durations = defaultdict(float)
+
+    def record(self, statement, duration):
+        """Add an executed statement."""
+        shape = statement_shape(statement)
+        self.queries += 1
+        self.duration += duration
+        self.counts[shape] += 1
+        self.durations[shape] += duration
+
+    def top(self, limit=TOP_STATEMENTS):
+        """Return the statements which took the most time."""
+        shapes = sorted(self.durations, key=self.durations.get, reverse=True)
+        return [(s, self.counts[s], self.durations[s])
+                for s in shapes[:limit]]
+
+    def repeated(self, limit):
+        """Return the statements executed more than a number of times."""
+        return [(s, n) for s, n in self.counts.most_common() if n > limit]
+
+    def server_timing(self):
+        """Describe the time spent, as a Server-Timing header value."""
+        elapsed = time.monotonic() - self.started
+        return 'db;dur=%.1f;desc="%d queries", app;dur=%.1f' % (
+            self.duration * 1000, self.queries, elapsed * 1000)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters,
+                          context, executemany):
+    """Note the start time of a statement."""
+    # Kept with the statement, so that nothing is left if it fails
+    context._query_start_time = time.monotonic()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters,
+                         context, executemany):
+    """Add a statement to the stats of the request, if any."""
+    started = getattr(context, '_query_start_time', None)
+    if started is None:
+        return
+    duration = time.monotonic() - started
+    if has_app_context() and 'sqlstats' in g:
+        g.sqlstats.record(statement, duration)
+
+
+def start_request():
+    """Start collecting the stats of a request."""
+    g.sqlstats = RequestStats()
+
+
+def finish_request(response):
+    """Add the stats to the response, then report on them."""
+    stats = g.get('sqlstats')
+    if stats is None:
+        return response
+    response.headers['Server-Timing'] = stats.server_timing()
+    report = partial(report_request, current_app._get_current_object(),
+                     request.method, request.full_path.rstrip('?'), stats)
+    if response.is_streamed:
+        # Statements are still made while the body is generated, so the
+        # report waits until it has been sent
+        response.call_on_close(report)
+    else:
+        g.pop('sqlstats')
+        report()
+    return response
+
+
+def report_request(app, method, path, stats):
+    """Log slow requests, and statements repeated in a loop."""
+    config = app.config
+    elapsed = (time.monotonic() - stats.started) * 1000
+    if elapsed > config['SQL_SLOW_REQUEST'] \
+       or stats.queries > config['SQL_SLOW_QUERIES']:
+        app.logger.warning(
+            "Slow request %s %s: %.0f ms, %d queries in %.0f ms\n%s",
+            method, path, elapsed, stats.queries,
+            stats.duration * 1000, '\n'.join(
+                "  %dx %.1f ms: %s" % (n, d * 1000, s[:300])
+                for s, n, d in stats.top()))
+    for shape, count in stats.repeated(config['SQL_REPEAT_LIMIT']):
+        app.logger.warning(
+            "Possible N+1 in %s %s: %d times %s",
+            method, path, count, shape[:300])
+
+
+def init_app(app):
+    """Instrument the database engine and the requests of an app."""
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute',
+                          before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    app.before_request(start_request)
+    app.after_request(finish_request)
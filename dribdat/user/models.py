@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 """User models."""
 
-from sqlalchemy import Table, or_
-from sqlalchemy_continuum import make_versioned
+from sqlalchemy import Table, and_, or_, case, func
+from sqlalchemy.orm import Session, object_session, selectinload
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.event import listens_for
+from sqlalchemy_continuum import make_versioned, version_class
 from sqlalchemy_continuum.plugins import FlaskPlugin
 from dribdat.user.constants import (
     CLEAR_STATUS_AFTER,
@@ -26,7 +29,8 @@ from dribdat.database import (
     reference_col,
     SqliteDecimal,
 )
-from dribdat.extensions import hashing
+from dribdat.extensions import hashing, cache
+from dribdat.boxout.dribdat import preview_key
 from dribdat.apifetch import FetchGitlabAvatar
 from flask import current_app
 from flask_login import UserMixin
@@ -35,7 +39,10 @@ from dateutil.parser import parse
 from dateutil.parser._parser import ParserError
 import datetime as dt
 import hashlib
+import json
+import pytz
 import re
+import secrets
 from urllib.parse import urlencode, urlparse
 # Standard library fix
 from future.standard_library import install_aliases
@@ -201,30 +208,38 @@ class User(UserMixin, PkModel):
 
     def joined_projects(self, with_challenges=True, limit=-1):
         """Retrieve all projects user has joined."""
-        activities = Activity.query.filter_by(
-                user_id=self.id, name='star'
-            ).order_by(Activity.timestamp.desc())
+        projects = self.joined_projects_query(with_challenges)
         if limit > 0:
-            activities = activities.limit(limit)
-        else:
-            activities = activities.all()
-        projects = []
-        project_ids = []
-        for a in activities:
-            if limit > 0 and len(projects) >= limit: break
-            if a.project_id not in project_ids and not a.project.is_hidden:
-                a_prog = a.project.progress
-                not_challenge = a_prog is not None and a_prog > 0
-                if with_challenges or not_challenge:
-                    projects.append(a.project)
-                    project_ids.append(a.project_id)
+            projects = projects.limit(limit)
+        return Project.bulk_load(projects)
+
+    def joined_projects_query(self, with_challenges=True):
+        """Query the projects user has joined."""
+        # Latest first, by when the user joined the team
+        stars = db.session.query(
+                Activity.project_id,
+                func.max(Activity.timestamp).label('starred_at'),
+            ).filter_by(user_id=self.id, name='star') \
+            .group_by(Activity.project_id).subquery()
+        projects = Project.query \
+            .join(stars, stars.c.project_id == Project.id)
+        return self.filter_joined(projects, with_challenges) \
+            .order_by(stars.c.starred_at.desc(), Project.id.desc())
+
+    def filter_joined(self, projects, with_challenges=True):
+        """Keep the visible, and optionally only the started, projects."""
+        projects = projects.filter(Project.is_hidden.isnot(True))
+        if not with_challenges:
+            projects = projects.filter(Project.progress > 0)
         return projects
 
-
     def get_score(self):
         """Calculate the total score across projects."""
-        projects = self.joined_projects(False)
-        return sum([p.score for p in projects])
+        stars = db.select(Activity.project_id) \
+            .where(Activity.user_id == self.id, Activity.name == 'star')
+        score = db.session.query(func.coalesce(func.sum(Project.score), 0)) \
+            .filter(Project.id.in_(stars))
+        return self.filter_joined(score, False).scalar()
 
 
     def posted_challenges(self):
@@ -329,6 +344,10 @@ class Event(PkModel):
     """What's the buzz? Tell me what's a-happening."""
 
     __tablename__ = 'events'
+    __table_args__ = (
+        # Used to find the featured event
+        db.Index('ix_events_is_current', 'is_current'),
+    )
     name = Column(db.String(80), unique=True, nullable=False)
     summary = Column(db.String(140), nullable=True)       # a short description of the event
     hostname = Column(db.String(80), nullable=True)       # institution hosting the event
@@ -577,11 +596,53 @@ class Event(PkModel):
         return '<Event({name})>'.format(name=self.name)
 
 
+# Seconds to keep the challenge versions of an event, removed on changes
+CHALLENGES_TIMEOUT = 24 * 3600
+
+# Activities per page of a project timeline, the first page being cached
+TIMELINE_PAGE = 50
+TIMELINE_TIMEOUT = 24 * 3600  # seconds, removed on new activity
+
+# Commits are synced again this far back, in case they were pushed late
+COMMITS_OVERLAP = dt.timedelta(days=1)
+
+# Points given to projects for content longer than a minimum length;
+# shared by Project.calculate_score and the SQL scoring in aggregation
+SCORE_CONTENT_RULES = [
+    # Every complete documentation field
+    ('summary', 3, 1),
+    ('image_url', 3, 1),
+    ('source_url', 3, 1),
+    ('webpage_url', 3, 1),
+    ('logo_color', 3, 1),
+    ('logo_icon', 3, 1),
+    # More points based on how much content you share
+    ('longtext', 3, 1),
+    ('longtext', 100, 3),
+    ('longtext', 500, 5),
+    # Points for external (Readme) content
+    ('autotext', 3, 1),
+    ('autotext', 100, 3),
+    ('autotext', 500, 5),
+]
+
+
 class Project(PkModel):
     """You know, for kids."""
 
-    __versioned__ = {}
+    # Counters are maintained by activity events, not versioned
+    __versioned__ = {
+        'exclude': [
+            'count_stars', 'count_boosts', 'count_activities',
+            'count_commits', 'last_activity_at', 'commits_synced_at',
+        ]
+    }
     __tablename__ = 'projects'
+    __table_args__ = (
+        # Used to list the visible projects or challenges of an event
+        db.Index('ix_projects_event_hidden_progress',
+                 'event_id', 'is_hidden', 'progress'),
+    )
     name = Column(db.String(80), unique=True, nullable=False)
     ident = Column(db.String(10), nullable=True)
     hashtag = Column(db.String(140), nullable=True)
@@ -626,6 +687,21 @@ class Project(PkModel):
     progress = Column(db.Integer(), nullable=True, default=-1)
     score = Column(db.Integer(), nullable=True, default=0)
 
+    # Denormalized activity counters, kept up to date by the listeners of
+    # Activity. Bulk Query.update() and delete() bypass these: follow them
+    # with RefreshProjectCounters (the `counters` command).
+    count_stars = Column(db.Integer(), nullable=False,
+                         default=0, server_default='0')
+    count_boosts = Column(db.Integer(), nullable=False,
+                          default=0, server_default='0')
+    count_activities = Column(db.Integer(), nullable=False,
+                              default=0, server_default='0')
+    count_commits = Column(db.Integer(), nullable=False,
+                           default=0, server_default='0')
+    last_activity_at = Column(db.DateTime, nullable=True)
+    # Time (UTC) of the newest commit synced (see SyncCommitData)
+    commits_synced_at = Column(db.DateTime, nullable=True)
+
     @property
     def team(self):
         """Array of project team."""
@@ -653,6 +729,17 @@ class Project(PkModel):
         """Return True if this project can be autoupdated."""
         return self.autotext_url and self.autotext_url.strip()
 
+    @property
+    def commits_since(self):
+        """Return the time from which remote commits need to be synced."""
+        since = self.event.starts_at_tz if self.event else None
+        if self.commits_synced_at is not None:
+            synced = pytz.utc.localize(self.commits_synced_at) \
+                - COMMITS_OVERLAP
+            if since is None or synced > since:
+                since = synced
+        return since
+
     @property
     def webembed(self):
         """Detect and return supported embed widgets."""
@@ -675,6 +762,10 @@ class Project(PkModel):
     @property
     def data(self):
         """Get JSON representation."""
+        return self.get_data(self.team)
+
+    def get_data(self, team):
+        """Get JSON representation with a known list of team names."""
         d = {
             'id': self.id,
             'ident': self.ident,
@@ -682,7 +773,7 @@ class Project(PkModel):
             'name': self.name,
             'score': self.score,
             'phase': self.phase,
-            'team': self.team,
+            'team': team,
             'team_count': self.team_count,
             'is_challenge': self.is_challenge,
             'is_webembed': self.is_webembed,
@@ -728,6 +819,54 @@ class Project(PkModel):
             d['category_id'] = d['category_name'] = ''
         return d
 
+    @classmethod
+    def bulk_query(cls, query):
+        """Load the related objects of projects along with them."""
+        return query.options(
+            selectinload(cls.user),
+            selectinload(cls.event),
+            selectinload(cls.category),
+        )
+
+    @classmethod
+    def bulk_load(cls, query):
+        """Fetch projects with their related objects eagerly loaded."""
+        return cls.bulk_query(query).all()
+
+    @classmethod
+    def bulk_teams(cls, projects):
+        """Return team usernames for a list of projects in one query."""
+        teams = {}
+        members = {}
+        for p in projects:
+            teams[p.id] = []
+            members[p.id] = set()
+            if p.user is not None:
+                teams[p.id].append(p.user.username)
+                members[p.id].add(p.user_id)
+        if not teams:
+            return teams
+        stars = db.session.query(
+                Activity.project_id, User.id, User.username
+            ).join(User, Activity.user_id == User.id) \
+            .filter(Activity.name == 'star') \
+            .filter(Activity.project_id.in_(list(teams.keys()))) \
+            .group_by(Activity.project_id, User.id, User.username) \
+            .order_by(func.min(Activity.id))
+        for (project_id, user_id, username) in stars:
+            if user_id not in members[project_id]:
+                teams[project_id].append(username)
+                members[project_id].add(user_id)
+        return teams
+
+    @classmethod
+    def bulk_data(cls, projects):
+        """Get JSON representations of a query or list of projects."""
+        if not isinstance(projects, list):
+            projects = cls.bulk_load(projects)
+        teams = cls.bulk_teams(projects)
+        return [p.get_data(teams[p.id]) for p in projects]
+
     def latest_activity(self, max=5):
         """Query for latest activity."""
         q = Activity.query.filter_by(project_id=self.id)
@@ -737,10 +876,7 @@ class Project(PkModel):
     @property
     def team_count(self):
         """Return follower count."""
-        # TODO: this is much too slow
-        return Activity.query \
-            .filter_by(project_id=self.id, name='star') \
-            .count()
+        return self.count_stars or 0
 
     def get_team(self, with_spectators=False):
         """Return all starring users (A team)."""
@@ -761,44 +897,53 @@ class Project(PkModel):
 
     def get_stats(self):
         """Collect some activity stats."""
-        q = self.activities
-
-        # Basic statistics
-        s_total = len(q)
-        s_updates = 0
-        s_commits = 0
-        s_during = 0
-        s_people = 0
-        for act in q:
-            if act.name == 'update':
-                s_updates += 1
-                if act.action == 'commit':
-                    s_commits += 1
-            elif act.name == 'star':
-                s_people += 1
-            if self.event:
-                if act.timestamp > self.event.starts_at and \
-                   act.timestamp < self.event.ends_at:
-                    s_during += 1
-
-        # A byte count of contents
-        s_sizepitch = 0
-        if self.longtext:
-            s_sizepitch += len(self.longtext.strip())
-        s_sizetotal = s_sizepitch
-        if self.autotext:
-            s_sizetotal += len(self.autotext)
-        if self.summary:
-            s_sizetotal += len(self.summary.strip())
-        return {
-            'total':     s_total,
-            'updates':   s_updates,
-            'commits':   s_commits,
-            'during':    s_during,
-            'people':    s_people,
-            'sizepitch': s_sizepitch,
-            'sizetotal': s_sizetotal,
-        }
+        return Project.bulk_stats([self])[self.id]
+
+    @classmethod
+    def bulk_stats(cls, projects):
+        """Collect the activity stats of a list of projects in one query."""
+        counts = {}
+        ids = [p.id for p in projects]
+        if ids:
+            def count_if(condition):
+                return func.sum(case((condition, 1), else_=0))
+            is_update = Activity.name == 'update'
+            rows = db.session.query(
+                    Activity.project_id,
+                    func.count(Activity.id),
+                    count_if(is_update),
+                    count_if(and_(is_update, Activity.action == 'commit')),
+                    count_if(Activity.name == 'star'),
+                    count_if(and_(Activity.timestamp > Event.starts_at,
+                                  Activity.timestamp < Event.ends_at)),
+                ).join(cls, Activity.project_id == cls.id) \
+                .outerjoin(Event, cls.event_id == Event.id) \
+                .filter(Activity.project_id.in_(ids)) \
+                .group_by(Activity.project_id)
+            counts = {r[0]: r[1:] for r in rows}
+        stats = {}
+        for p in projects:
+            s_total, s_updates, s_commits, s_people, s_during = \
+                counts.get(p.id, (0, 0, 0, 0, 0))
+            # A byte count of contents
+            s_sizepitch = 0
+            if p.longtext:
+                s_sizepitch += len(p.longtext.strip())
+            s_sizetotal = s_sizepitch
+            if p.autotext:
+                s_sizetotal += len(p.autotext)
+            if p.summary:
+                s_sizetotal += len(p.summary.strip())
+            stats[p.id] = {
+                'total':     s_total,
+                'updates':   s_updates or 0,
+                'commits':   s_commits or 0,
+                'during':    s_during or 0,
+                'people':    s_people or 0,
+                'sizepitch': s_sizepitch,
+                'sizetotal': s_sizetotal,
+            }
+        return stats
 
     def get_missing_roles(self):
         """List all roles which are not yet in team."""
@@ -810,14 +955,54 @@ class Project(PkModel):
                     rollcall.append(r)
         return [r for r in get_roles if r not in rollcall and r.name]
 
-    def all_dribs(self, limit=50):
+    def all_dribs(self, limit=TIMELINE_PAGE):
         """Query which formats the project's timeline."""
-        activities = Activity.query.filter_by(
-                        project_id=self.id
-                    ).order_by(Activity.timestamp.desc())
+        return self.timeline(limit=limit)[0]
+
+    def timeline(self, before_id=None, limit=TIMELINE_PAGE):
+        """Return a page of the timeline, and the id to continue from."""
+        # The first page is cached until the next activity is logged
+        is_first = before_id is None and limit == TIMELINE_PAGE
+        page = cache.get(timeline_key(self.id)) if is_first else None
+        if page is None:
+            page = self.build_timeline(before_id, limit)
+            if is_first:
+                cache.set(timeline_key(self.id), page,
+                          timeout=TIMELINE_TIMEOUT)
+        else:
+            # Users may have been renamed since
+            page['dribs'] = timeline_authors(page['dribs'])
+        dribs = page['dribs'] + [
+            d for d in self.event_dribs()
+            if (page['next'] is None or d['date'] >= page['since'])
+            and (page['until'] is None or d['date'] < page['until'])
+        ]
+        return sorted(dribs, key=lambda x: x['date'], reverse=True), \
+            page['next']
+
+    def build_timeline(self, before_id=None, limit=TIMELINE_PAGE):
+        """Format a page of the project's activities, latest first."""
+        activities = Activity.query.filter_by(project_id=self.id) \
+            .options(selectinload(Activity.user))
+        until = None
+        if before_id is not None:
+            cursor = Activity.query.filter_by(
+                id=before_id, project_id=self.id).first()
+            if cursor is not None:
+                # Continue after the last activity of the previous page
+                until = cursor.timestamp
+                activities = activities.filter(or_(
+                    Activity.timestamp < until,
+                    and_(Activity.timestamp == until,
+                         Activity.id < cursor.id)))
+        activities = activities.order_by(
+            Activity.timestamp.desc(), Activity.id.desc())
         if limit is not None:
-            activities = activities.limit(limit)
+            activities = activities.limit(limit + 1)
         activities_array = activities.all()
+        has_more = limit is not None and len(activities_array) > limit
+        if has_more:
+            activities_array = activities_array[:limit]
         dribs = []
         only_active = False  # show dribs from inactive users
         prev = { 'progress': None, 'title': None, 'text': None }
@@ -837,6 +1022,7 @@ class Project(PkModel):
                 'title': title,
                 'text': text,
                 'author': author,
+                'user_id': a.user_id if author and a.user else None,
                 'name': a.name,
                 'date': a.timestamp,
                 'ref_url': a.ref_url,
@@ -857,13 +1043,26 @@ class Project(PkModel):
             prev = cur
 
         # Start all logs at stage 0
-        if len(activities_array) > 0:
+        if len(activities_array) > 0 and not has_more:
             dribs.append({
                 'title': getStageByProgress(0)['phase'],
-                'date': activities_array.pop().timestamp,
+                'date': activities_array[-1].timestamp,
                 'icon': 'arrow-up',
                 'name': 'progress',
             })
+        return {
+            'dribs': dribs,
+            'next': activities_array[-1].id if has_more else None,
+            'since': activities_array[-1].timestamp
+            if activities_array else None,
+            'until': until,
+        }
+
+    def event_dribs(self):
+        """Return the start and finish of the event for the timeline."""
+        dribs = []
+        if self.event is None:
+            return dribs
         # Add event start and finish to log
         if self.event.has_started or self.event.has_finished:
             dribs.append({
@@ -879,7 +1078,7 @@ class Project(PkModel):
                 'icon': 'bullhorn',
                 'name': 'finish',
             })
-        return sorted(dribs, key=lambda x: x['date'], reverse=True)
+        return dribs
 
     def categories_all(self, event=None):
         """Return convenience query for all categories."""
@@ -899,6 +1098,57 @@ class Project(PkModel):
         self.progress = 0
         return self
 
+    @classmethod
+    def bulk_challenges(cls, projects):
+        """Find the last challenge versions of projects in one query."""
+        # Like as_challenge, but read-only: returns dicts by project id
+        versions = version_class(cls).__table__
+        columns = [c.key for c in versions.columns
+                   if c.key in cls.__table__.columns]
+        ids = [p.id for p in projects]
+        if not ids:
+            return {}
+        latest = db.select(
+                versions.c.id.label('project_id'),
+                func.max(case(
+                    (versions.c.progress <= 0, versions.c.transaction_id)
+                )).label('transaction_id'),
+            ).where(versions.c.id.in_(ids)) \
+            .group_by(versions.c.id).subquery()
+        rows = db.session.execute(
+            db.select(latest.c.project_id, *[versions.c[k] for k in columns])
+            .select_from(latest.outerjoin(versions, and_(
+                versions.c.id == latest.c.project_id,
+                versions.c.transaction_id == latest.c.transaction_id))))
+        found = {r.project_id: r for r in rows}
+        snapshots = {}
+        for p in projects:
+            row = found.get(p.id)
+            if row is not None and row.id is not None:
+                snapshots[p.id] = {k: getattr(row, k) for k in columns}
+                continue
+            snapshots[p.id] = {k: getattr(p, k) for k in columns}
+            if row is not None:
+                # There are versions, but none of them is a challenge
+                snapshots[p.id]['progress'] = 0
+        return snapshots
+
+    @classmethod
+    def challenge_snapshots(cls, event_id, projects=()):
+        """Return the challenge versions of the projects of an event."""
+        key = challenges_key(event_id)
+        snapshots = cache.get(key)
+        if snapshots is None:
+            snapshots = cls.bulk_challenges(
+                cls.query.filter_by(event_id=event_id).all())
+            cache.set(key, snapshots, timeout=CHALLENGES_TIMEOUT)
+        # Add any of the given projects created since then
+        missing = [p for p in projects if p.id not in snapshots]
+        if missing:
+            snapshots.update(cls.bulk_challenges(missing))
+            cache.set(key, snapshots, timeout=CHALLENGES_TIMEOUT)
+        return snapshots
+
     def get_schema(self, host_url=''):
         """Schema.org compatible metadata."""
         # TODO: accurately detect project license based on component etc.
@@ -1023,34 +1273,20 @@ class Project(PkModel):
         if self.autotext is None:
             self.autotext = ''
 
-    def calculate_score(self):  # noqa: C901
+    def calculate_score(self):
         """Calculate score of a project based on base progress."""
         score = self.progress or 0
-        cqu = Activity.query.filter_by(project_id=self.id)
         # Challenges only get a point per team-member
         if self.is_challenge:
-            return cqu.filter_by(name='star').count()
+            return self.count_stars or 0
         # Get a point for every (join, update, comment ..) activity in dribs
-        c_s = cqu.count()
-        score = score + (1 * c_s)
+        score = score + (1 * (self.count_activities or 0))
         # Extra point for every boost (upvote)
-        c_a = cqu.filter_by(name="boost").count()
-        score = score + (1 * c_a)
-        # Add to the score for every complete documentation field
-        score = score + 1 * int(len(self.summary) > 3)
-        score = score + 1 * int(len(self.image_url) > 3)
-        score = score + 1 * int(len(self.source_url) > 3)
-        score = score + 1 * int(len(self.webpage_url) > 3)
-        score = score + 1 * int(len(self.logo_color) > 3)
-        score = score + 1 * int(len(self.logo_icon) > 3)
-        # Get more points based on how much content you share
-        score = score + 1 * int(len(self.longtext) > 3)
-        score = score + 3 * int(len(self.longtext) > 100)
-        score = score + 5 * int(len(self.longtext) > 500)
-        # Points for external (Readme) content
-        score = score + 1 * int(len(self.autotext) > 3)
-        score = score + 3 * int(len(self.autotext) > 100)
-        score = score + 5 * int(len(self.autotext) > 500)
+        score = score + (1 * (self.count_boosts or 0))
+        # Add to the score for complete fields and shared content
+        for (field, min_length, points) in SCORE_CONTENT_RULES:
+            value = getattr(self, field) or ''
+            score = score + points * int(len(value) > min_length)
         # Cap at 100%
         score = min(score, 100)
         return score
@@ -1067,6 +1303,9 @@ class Category(PkModel):
     """Is it a bird? Is it a plane?."""
 
     __tablename__ = 'categories'
+    __table_args__ = (
+        db.Index('ix_categories_event_id', 'event_id'),
+    )
     name = Column(db.String(80), nullable=False)
     description = Column(db.UnicodeText(), nullable=True)
     logo_color = Column(db.String(7), nullable=True)
@@ -1129,6 +1368,19 @@ class Activity(PkModel):
     """Public, real time, conversational."""
 
     __tablename__ = 'activities'
+    __table_args__ = (
+        # Used to look up previously synced commits
+        db.Index('ix_activities_project_ref_url', 'project_id', 'ref_url'),
+        # Used by the activity feeds of projects and users
+        db.Index('ix_activities_project_timestamp', 'project_id', 'timestamp'),
+        db.Index('ix_activities_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_activities_name_action_id', 'name', 'action', 'id'),
+        # Used to find the team of a project, and a user's joined projects
+        db.Index('ix_activities_project_name_user',
+                 'project_id', 'name', 'user_id'),
+        db.Index('ix_activities_user_name_timestamp',
+                 'user_id', 'name', 'timestamp'),
+    )
     name = Column(db.Enum('review',
                           'boost',
                           'create',
@@ -1254,3 +1506,224 @@ class Resource(PkModel):
 
     def __repr__(self):  # noqa: D105
         return '<Resource({name})>'.format(name=self.name)
+
+
+def job_token():
+    """Return a random, unguessable reference to a job."""
+    return secrets.token_urlsafe(16)
+
+
+class Job(PkModel):
+    """Background task, queued in the database."""
+
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    name = Column(db.String(80), nullable=False)
+    # Used in links to the job, instead of the sequential id
+    token = Column(db.String(32), nullable=True, unique=True,
+                   default=job_token)
+    # 'queued', 'running', 'done', 'failed'
+    status = Column(db.String(16), nullable=False, default='queued')
+    # JSON blobs of the task arguments and return value
+    params = Column(db.UnicodeText, nullable=True)
+    result = Column(db.UnicodeText, nullable=True)
+    # Binary output, such as a generated file
+    output = Column(db.LargeBinary, nullable=True)
+    error = Column(db.UnicodeText, nullable=True)
+    attempts = Column(db.Integer, nullable=False, default=0)
+    max_attempts = Column(db.Integer, nullable=False, default=3)
+
+    created_at = Column(db.DateTime, nullable=False,
+                        default=dt.datetime.utcnow)
+    run_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    started_at = Column(db.DateTime, nullable=True)
+    finished_at = Column(db.DateTime, nullable=True)
+
+    # Who requested this job, if anyone
+    user_id = reference_col('users', nullable=True)
+    user = relationship('User', backref='jobs')
+
+    @property
+    def is_finished(self):
+        """Return True if the job will not run again."""
+        return self.status in ['done', 'failed']
+
+    @property
+    def data(self):
+        """Get JSON representation."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error or '',
+            'attempts': self.attempts,
+            'has_output': self.output is not None,
+            'created_at': format_date(self.created_at, '%Y-%m-%dT%H:%M:%S'),
+            'run_at': format_date(self.run_at, '%Y-%m-%dT%H:%M:%S'),
+            'finished_at': format_date(
+                self.finished_at, '%Y-%m-%dT%H:%M:%S')
+                if self.finished_at else None,
+        }
+
+    def may_view(self, user):
+        """Check permission for reading the job status."""
+        # Anonymous jobs are reached by whoever has their token
+        if self.user_id is None:
+            return True
+        if user is None or user.is_anonymous:
+            return False
+        return user.id == self.user_id or user.is_admin
+
+    def __repr__(self):  # noqa: D105
+        return '<Job({name}:{status})>'.format(
+            name=self.name, status=self.status)
+
+
+def activity_counter_values(name, action, delta):
+    """Return the project counter changes caused by an activity."""
+    projects = Project.__table__.c
+    values = {
+        'count_activities': projects.count_activities + delta,
+    }
+    if name == 'star':
+        values['count_stars'] = projects.count_stars + delta
+    elif name == 'boost':
+        values['count_boosts'] = projects.count_boosts + delta
+    elif name == 'update' and action == 'commit':
+        values['count_commits'] = projects.count_commits + delta
+    return values
+
+
+def last_activity_value(project_id):
+    """Return the time of the latest activity of a project, as SQL."""
+    activities = Activity.__table__.c
+    return db.select(
+            db.func.max(activities.timestamp)
+        ).where(activities.project_id == project_id) \
+        .scalar_subquery()
+
+
+def update_project_counters(connection, project_id, values):
+    """Apply counter changes to a project."""
+    connection.execute(
+        Project.__table__.update()
+        .where(Project.__table__.c.id == project_id)
+        .values(**values))
+
+
+def challenges_key(event_id):
+    """Return the cache key of the challenges of an event."""
+    return 'challenges/%s' % event_id
+
+
+def timeline_key(project_id):
+    """Return the cache key of the first page of a project timeline."""
+    return 'timeline/%s' % project_id
+
+
+def timeline_authors(dribs):
+    """Look up the current usernames of the authors of dribs."""
+    ids = {d['user_id'] for d in dribs if d.get('user_id')}
+    if not ids:
+        return dribs
+    names = dict(db.session.query(User.id, User.username)
+                 .filter(User.id.in_(ids)))
+    return [
+        dict(d, author=names.get(d['user_id'], '?'))
+        if d.get('user_id') else d
+        for d in dribs
+    ]
+
+
+def invalidate_after_commit(target, *keys):
+    """Remove cache entries once the changes of an object are committed."""
+    # Until then, other requests would cache the old data again
+    session = object_session(target)
+    if session is None:
+        delete_cached(keys)
+    else:
+        session.info.setdefault('cache_keys', set()).update(keys)
+
+
+@listens_for(Session, 'after_commit')
+def session_after_commit(session):
+    """Remove the cache entries made stale by the transaction."""
+    delete_cached(session.info.pop('cache_keys', ()))
+
+
+def delete_cached(keys):
+    """Remove cache entries, whether or not they are there."""
+    # Unlike this, delete_many may stop at the first key not found
+    for key in keys:
+        cache.delete(key)
+
+
+@listens_for(Project, 'after_insert')
+@listens_for(Project, 'after_update')
+@listens_for(Project, 'after_delete')
+def project_after_change(mapper, connection, project):
+    """Remove the cached preview and challenges of a project."""
+    # Including those of the event the project was moved from
+    history = get_history(project, 'event_id')
+    invalidate_after_commit(project, preview_key(project.id), *[
+        challenges_key(event_id)
+        for event_id in set(history.sum()) | {project.event_id}
+    ])
+
+
+@listens_for(Activity, 'after_insert')
+def activity_after_insert(mapper, connection, activity):
+    """Increment project counters in the same transaction."""
+    if activity.project_id is None:
+        return
+    invalidate_after_commit(activity, timeline_key(activity.project_id))
+    projects = Project.__table__.c
+    values = activity_counter_values(activity.name, activity.action, 1)
+    values['last_activity_at'] = case(
+        (or_(projects.last_activity_at == None,  # noqa: E711
+             projects.last_activity_at < activity.timestamp),
+         activity.timestamp),
+        else_=projects.last_activity_at)
+    update_project_counters(connection, activity.project_id, values)
+
+
+@listens_for(Activity, 'after_update')
+def activity_after_update(mapper, connection, activity):
+    """Move the counts of an activity which changed project or type."""
+    history = {
+        key: get_history(activity, key)
+        for key in ('project_id', 'name', 'action', 'timestamp')
+    }
+    old = {
+        key: h.deleted[0] if h.deleted else getattr(activity, key)
+        for key, h in history.items()
+    }
+    invalidate_after_commit(activity, *[
+        timeline_key(project_id)
+        for project_id in {old['project_id'], activity.project_id}
+        if project_id is not None
+    ])
+    if not any(h.has_changes() for h in history.values()):
+        return
+    if old['project_id'] is not None:
+        values = activity_counter_values(old['name'], old['action'], -1)
+        values['last_activity_at'] = last_activity_value(old['project_id'])
+        update_project_counters(connection, old['project_id'], values)
+    if activity.project_id is not None:
+        values = activity_counter_values(activity.name, activity.action, 1)
+        values['last_activity_at'] = last_activity_value(activity.project_id)
+        update_project_counters(connection, activity.project_id, values)
+
+
+@listens_for(Activity, 'after_delete')
+def activity_after_delete(mapper, connection, activity):
+    """Decrement project counters in the same transaction."""
+    if activity.project_id is None:
+        return
+    invalidate_after_commit(activity, timeline_key(activity.project_id))
+    values = activity_counter_values(activity.name, activity.action, -1)
+    values['last_activity_at'] = last_activity_value(activity.project_id)
+    update_project_counters(connection, activity.project_id, values)
@@ -0,0 +1,46 @@
+"""Indexes for hot lookups
+
+Revision ID: 3a6f0c8e5d21
+Revises: 7e2b9d4c1a86
+Create Date: 2024-04-29 10:21:53.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a6f0c8e5d21'
+down_revision = '7e2b9d4c1a86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.create_index('ix_activities_project_name_user', ['project_id', 'name', 'user_id'], unique=False)
+        batch_op.create_index('ix_activities_user_name_timestamp', ['user_id', 'name', 'timestamp'], unique=False)
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.create_index('ix_categories_event_id', ['event_id'], unique=False)
+
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.create_index('ix_events_is_current', ['is_current'], unique=False)
+
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.create_index('ix_projects_event_hidden_progress', ['event_id', 'is_hidden', 'progress'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_index('ix_projects_event_hidden_progress')
+
+    with op.batch_alter_table('events', schema=None) as batch_op:
+        batch_op.drop_index('ix_events_is_current')
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_index('ix_categories_event_id')
+
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.drop_index('ix_activities_user_name_timestamp')
+        batch_op.drop_index('ix_activities_project_name_user')
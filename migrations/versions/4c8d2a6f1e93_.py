@@ -0,0 +1,95 @@
+"""Full text search index on projects
+
+Revision ID: 4c8d2a6f1e93
+Revises: 9f3c1e7a2b4d
+Create Date: 2024-04-09 16:41:05.118302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8d2a6f1e93'
+down_revision = '9f3c1e7a2b4d'
+branch_labels = None
+depends_on = None
+
+PG_SEARCH_DDL = [
+    """
+    ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(summary, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(longtext, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(autotext, '')), 'D')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_projects_search_vector
+    ON projects USING GIN (search_vector)
+    """,
+]
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+        name, summary, longtext, autotext,
+        content='projects', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_ai AFTER INSERT ON projects
+    BEGIN
+        INSERT INTO projects_fts (rowid, name, summary, longtext, autotext)
+        VALUES (new.id, new.name, new.summary, new.longtext, new.autotext);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_ad AFTER DELETE ON projects
+    BEGIN
+        INSERT INTO projects_fts
+            (projects_fts, rowid, name, summary, longtext, autotext)
+        VALUES ('delete',
+            old.id, old.name, old.summary, old.longtext, old.autotext);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_au
+    AFTER UPDATE OF name, summary, longtext, autotext ON projects
+    BEGIN
+        INSERT INTO projects_fts
+            (projects_fts, rowid, name, summary, longtext, autotext)
+        VALUES ('delete',
+            old.id, old.name, old.summary, old.longtext, old.autotext);
+        INSERT INTO projects_fts (rowid, name, summary, longtext, autotext)
+        VALUES (new.id, new.name, new.summary, new.longtext, new.autotext);
+    END
+    """,
+    """
+    INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')
+    """,
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statements = PG_SEARCH_DDL
+    elif dialect == 'sqlite':
+        statements = SQLITE_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_projects_search_vector")
+        op.execute("ALTER TABLE projects DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS projects_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS projects_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS projects_fts_ai")
+        op.execute("DROP TABLE IF EXISTS projects_fts")
@@ -0,0 +1,30 @@
+"""Activity feed indexes
+
+Revision ID: 7e2b9d4c1a86
+Revises: d5a91f4e7c02
+Create Date: 2024-04-26 14:08:37.215903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2b9d4c1a86'
+down_revision = 'd5a91f4e7c02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.create_index('ix_activities_project_timestamp', ['project_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_activities_user_timestamp', ['user_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_activities_name_action_id', ['name', 'action', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.drop_index('ix_activities_name_action_id')
+        batch_op.drop_index('ix_activities_user_timestamp')
+        batch_op.drop_index('ix_activities_project_timestamp')
@@ -0,0 +1,53 @@
+"""Denormalized activity counters on projects
+
+Revision ID: 9f3c1e7a2b4d
+Revises: 2e16efec66e4
+Create Date: 2024-04-02 10:12:31.204511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3c1e7a2b4d'
+down_revision = '2e16efec66e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('count_stars', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('count_boosts', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('count_activities', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('count_commits', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_activity_at', sa.DateTime(), nullable=True))
+
+    # Backfill the counters from existing activities
+    op.execute("""
+        UPDATE projects SET
+            count_stars = (SELECT COUNT(*) FROM activities
+                WHERE activities.project_id = projects.id
+                AND activities.name = 'star'),
+            count_boosts = (SELECT COUNT(*) FROM activities
+                WHERE activities.project_id = projects.id
+                AND activities.name = 'boost'),
+            count_activities = (SELECT COUNT(*) FROM activities
+                WHERE activities.project_id = projects.id),
+            count_commits = (SELECT COUNT(*) FROM activities
+                WHERE activities.project_id = projects.id
+                AND activities.name = 'update'
+                AND activities.action = 'commit'),
+            last_activity_at = (SELECT MAX(timestamp) FROM activities
+                WHERE activities.project_id = projects.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_column('last_activity_at')
+        batch_op.drop_column('count_commits')
+        batch_op.drop_column('count_activities')
+        batch_op.drop_column('count_boosts')
+        batch_op.drop_column('count_stars')
@@ -0,0 +1,35 @@
+"""Job tokens
+
+Revision ID: c2f7a9d41e68
+Revises: 3a6f0c8e5d21
+Create Date: 2024-05-06 11:02:37.215804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import secrets
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f7a9d41e68'
+down_revision = '3a6f0c8e5d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token', sa.String(length=32), nullable=True))
+        batch_op.create_unique_constraint('uq_jobs_token', ['token'])
+
+    jobs = sa.table('jobs', sa.column('id'), sa.column('token'))
+    bind = op.get_bind()
+    for (job_id,) in bind.execute(sa.select(jobs.c.id)).fetchall():
+        bind.execute(jobs.update().where(jobs.c.id == job_id)
+                     .values(token=secrets.token_urlsafe(16)))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_jobs_token', type_='unique')
+        batch_op.drop_column('token')
@@ -0,0 +1,32 @@
+"""Commit sync high-water mark
+
+Revision ID: d5a91f4e7c02
+Revises: b71e5d0c3a28
+Create Date: 2024-04-23 09:52:14.380645
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a91f4e7c02'
+down_revision = 'b71e5d0c3a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('commits_synced_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.create_index('ix_activities_project_ref_url', ['project_id', 'ref_url'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.drop_index('ix_activities_project_ref_url')
+
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_column('commits_synced_at')
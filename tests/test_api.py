@@ -3,10 +3,13 @@
 """
 import pytest
 import json
+import csv
+import io
 
 from dribdat.aggregation import ProjectActivity
 from dribdat.user.models import Event
 from dribdat.public.api import *
+from dribdat.jobs import enqueue, work
 
 from .factories import EventFactory, ProjectFactory, UserFactory
 
@@ -78,3 +81,148 @@ class TestApi:
         # Test Project search
         ppj = json.loads(projects_top_json().get_data())
         assert len(ppj['projects']) == 1
+
+        # Test participants, who have starred a project of the event
+        participants_csv = event_participants_csv.__wrapped__
+        empty = EventFactory()
+        empty.save()
+        assert participants_csv(empty.id).get_data() == b''
+        assert participants_csv(event.id).get_data() == b''
+        ProjectActivity(project, 'star', user)
+        csvdata = str(participants_csv(event.id).get_data())
+        assert user.username in csvdata
+
+    def test_csv_stream(self, testapp, monkeypatch):
+        """Stream CSV exports, in order of score."""
+        event = EventFactory()
+        event.save()
+        for score in [10, 30, 20]:
+            project = ProjectFactory(event=event, name='Score %d' % score)
+            project.save()
+            project.score = score
+            project.save()
+        res = testapp.get('/api/event/%d/projects.csv' % event.id)
+        names = [r['name'] for r in csv.DictReader(io.StringIO(res.text))]
+        assert names == ['Score 30', 'Score 20', 'Score 10']
+        # Rows are consumed one chunk at a time
+        monkeypatch.setattr('dribdat.apiutils.CSV_CHUNK', 1)
+        consumed = []
+
+        def rows():
+            for i in range(3):
+                consumed.append(i)
+                yield {'id': i, 'name': 'Row %d' % i}
+        chunks = stream_csv(rows())
+        assert next(chunks) == '"id","name"\r\n"0","Row 0"\r\n'
+        assert consumed == [0]
+        assert ''.join(chunks).count('Row') == 2
+
+    def test_json_stream(self, testapp):
+        """Page through projects with a cursor."""
+        event = EventFactory()
+        event.save()
+        for score in [10, 30, 20, 30, 0]:
+            project = ProjectFactory(event=event)
+            project.save()
+            project.score = score
+            project.save()
+        url = '/api/event/%d/projects.json' % event.id
+        res = testapp.get(url)
+        assert [p['score'] for p in res.json['projects']] == \
+            [30, 30, 20, 10, 0]
+        assert res.json['next'] is None
+        pages = []
+        res = testapp.get(url, {'limit': 2})
+        while True:
+            pages.append([p['score'] for p in res.json['projects']])
+            if res.json['next'] is None:
+                break
+            res = testapp.get(url, {'limit': 2, 'cursor': res.json['next']})
+        assert pages == [[30, 30], [20, 10], [0]]
+        testapp.get(url, {'cursor': 'x'}, status=400)
+        res = testapp.get('/api/events/projects.json')
+        assert len(res.json['projects']) == 5
+
+    def test_project_search(self, testapp):
+        """Search projects using the full text index."""
+        event = EventFactory(name="hello")
+        event.save()
+        other = EventFactory(name="other")
+        other.save()
+        first = ProjectFactory(event=event, name="Telescope calibration",
+                               summary="Pointing models for radio dishes")
+        first.save()
+        second = ProjectFactory(event=event, name="Dish washer",
+                                longtext="Keeps the <b>telescope</b> clean")
+        second.save()
+        ProjectFactory(event=other, name="Telescope hunt").save()
+        ProjectFactory(event=event, name="Telescope secret",
+                       is_hidden=True).save()
+
+        res = testapp.get('/api/project/search.json?q=telescope')
+        assert res.json['total'] == 3
+        # Matches in the name rank higher than in the text
+        assert res.json['projects'][-1]['name'] == "Dish washer"
+        snippet = res.json['projects'][-1]['snippet']
+        assert '&lt;b&gt;<mark>telescope</mark>&lt;/b&gt;' in snippet
+
+        # Prefix matching with filters and pagination
+        res = testapp.get('/api/project/search.json?q=teles&event=%d'
+                          '&limit=1&page=2' % event.id)
+        assert res.json['total'] == 2
+        assert len(res.json['projects']) == 1
+        assert res.json['projects'][0]['name'] == "Dish washer"
+
+        # The index follows updates to the project
+        second.longtext = "Nothing to see"
+        second.save()
+        res = testapp.get('/api/project/search.json?q=telescope&event=%d'
+                          % event.id)
+        assert res.json['total'] == 1
+
+    def test_background_jobs(self, app, testapp, monkeypatch):
+        """Queue jobs in the database and run them with the worker."""
+        app.config['JOB_BACKEND'] = 'database'
+        event = EventFactory(name="hello")
+        event.save()
+        res = testapp.get('/api/event/%d/datapackage.zip' % event.id,
+                          status=202)
+        job_url = res.json['job']['url']
+        assert res.json['job']['status'] == 'queued'
+        assert job_url.endswith(Job.query.one().token)
+        # Requests for the same package wait for the same job
+        res = testapp.get('/api/event/%d/datapackage.zip' % event.id,
+                          status=202)
+        assert res.json['job']['url'] == job_url
+        assert work(once=True) == 1
+        res = testapp.get(job_url)
+        assert res.json['job']['status'] == 'done'
+        res = testapp.get(res.json['job']['download_url'])
+        assert res.body.startswith(b'PK')
+        res = testapp.get('/api/event/%d/datapackage.zip' % event.id)
+        assert res.body.startswith(b'PK')
+        assert Job.query.count() == 1
+        # Generated files expire
+        app.config['JOB_OUTPUT_EXPIRY'] = -1
+        enqueue('event_autosync', event_id=event.id)
+        testapp.get(job_url + '/download', status=404)
+        assert work(once=True) == 1
+
+        # Failing jobs are retried with a growing delay
+        monkeypatch.setattr('dribdat.jobs.GetProjectData',
+                            lambda url, since=None, stream=False: {})
+        project = ProjectFactory(autotext_url='https://github.com/a/b')
+        project.save()
+        job = enqueue('project_autoupdate', project_id=project.id)
+        delays = []
+        for attempt in range(3):
+            assert work(once=True) == 1
+            job = Job.query.get(job.id)
+            delays.append((job.run_at - job.finished_at).total_seconds())
+            job.run_at = job.finished_at
+            job.save()
+        assert job.status == 'failed'
+        assert job.attempts == 3
+        assert 'README' in job.error
+        assert 25 < delays[0] < delays[1]
+        assert work(once=True) == 0
@@ -5,7 +5,8 @@ See: http://webtest.readthedocs.org/
 """
 from flask import url_for
 
-from dribdat.user.models import User, Project
+from dribdat.user.models import User, Project, timeline_key
+from dribdat.extensions import cache
 
 from dribdat.aggregation import ProjectActivity, AllowProjectEdit
 from dribdat.public.project import post_preview
@@ -149,6 +150,36 @@ class TestEditing:
         assert len(project_dribs) == 4 # includes start event drib
         assert len(project_badge) == 1
 
+    def test_project_timeline(self, db, testapp):
+        """Page through the timeline of a project."""
+        project = ProjectFactory()
+        event = EventFactory()
+        user = UserFactory()
+        project.event = event
+        project.save()
+        for i in range(5):
+            ProjectActivity(project, 'review', user, 'post', 'Drib %d' % i)
+        dribs, next_id = project.timeline(limit=3)
+        assert [d['text'] for d in dribs if d.get('id')] == \
+            ['Drib 4', 'Drib 3', 'Drib 2']
+        dribs, next_id = project.timeline(next_id, limit=3)
+        assert [d['text'] for d in dribs if d.get('id')] == \
+            ['Drib 1', 'Drib 0']
+        assert next_id is None
+        # The first page is cached until there is new activity
+        assert len(project.all_dribs()) == 7
+        assert cache.get(timeline_key(project.id)) is not None
+        ProjectActivity(project, 'review', user, 'post', 'Drib 5')
+        assert cache.get(timeline_key(project.id)) is None
+        assert project.all_dribs()[0]['text'] == 'Drib 5'
+        res = testapp.get('/project/%d' % project.id)
+        assert 'Drib 5' in res and 'next-dribs' not in res
+        # Authors are shown by their current name
+        assert cache.get(timeline_key(project.id)) is not None
+        user.username = 'renamed'
+        user.save()
+        assert project.all_dribs()[0]['author'] == 'renamed'
+
     def test_create_project(self, db, testapp):
         """Test creating projects anonymously."""
         # Create an event 
@@ -70,9 +70,18 @@ EOF""" % (url, url)
         project1 = ProjectFactory()
         project2 = ProjectFactory()
         project3 = ProjectFactory()
+        project3.save()
         getnav = navigate_around_project(project2)
         assert getnav['prev']['id'] == project1.id
         assert getnav['next']['id'] == project3.id
+        assert getnav['next']['name'] == project3.name
+        assert getnav['next']['url'] == '/project/%d' % project3.id
+        # Hidden projects are skipped
+        project3.is_hidden = True
+        project3.save()
+        getnav = navigate_around_project(project2, True)
+        assert 'next' not in getnav
+        assert getnav['prev']['url'] == '/project/%d/challenge' % project1.id
 
     def test_project_stage(self, project, testapp):
         """Check stage progression."""
@@ -6,12 +6,17 @@ import datetime as dt
 import pytest
 import pytz
 
-from dribdat.user.models import Role, User, Event
+from dribdat.user.models import (
+    Role, User, Event, Project, Activity, challenges_key,
+)
 from dribdat.user.constants import stageProjectToNext
 from dribdat.utils import timesince
 from dribdat.settings import Config
-from dribdat.aggregation import ProjectActivity
+from dribdat.aggregation import (
+    ProjectActivity, RefreshProjectCounters, RescoreEventProjects
+)
 from dribdat.boxout.dribdat import box_project
+from dribdat.extensions import cache
 
 from .factories import UserFactory, ProjectFactory, EventFactory
 
@@ -68,6 +73,23 @@ class TestUser:
         user.save()
         assert role in user.roles
 
+    def test_joined_projects(self):
+        """List the projects a user has joined."""
+        user = UserFactory()
+        user.save()
+        started, challenge, hidden = [ProjectFactory() for i in range(3)]
+        started.progress, started.score = 10, 20
+        challenge.progress, challenge.score = 0, 5
+        hidden.progress, hidden.score, hidden.is_hidden = 10, 30, True
+        for project in [started, challenge, hidden]:
+            project.save()
+            ProjectActivity(project, 'star', user)
+        assert user.joined_projects() == [challenge, started]
+        assert user.joined_projects(True, 1) == [challenge]
+        assert user.joined_projects(False) == [started]
+        assert user.get_score() == 20
+        assert UserFactory().get_score() == 0
+
 
 @pytest.mark.usefixtures('db')
 class TestEvent:
@@ -206,6 +228,92 @@ class TestProject:
         project.update_now()
         assert project.score == 1
 
+    def test_project_counters(self, db):
+        """Test denormalized activity counters."""
+        project = ProjectFactory()
+        project.save()
+        assert project.team_count == 0
+        user1 = UserFactory()
+        user2 = UserFactory()
+        ProjectActivity(project, 'star', user1)
+        ProjectActivity(project, 'star', user2)
+        ProjectActivity(project, 'boost', user1)
+        assert project.team_count == 2
+        assert project.count_boosts == 1
+        assert project.count_activities == 3
+        assert project.last_activity_at is not None
+        ProjectActivity(project, 'unstar', user2)
+        assert project.team_count == 1
+        assert project.count_activities == 2
+        # Counters survive a full recalculation
+        project.count_stars = 5
+        project.save()
+        assert RefreshProjectCounters() == 1
+        db.session.refresh(project)
+        assert project.team_count == 1
+        assert project.count_activities == 2
+        assert project.versions.count() == 1
+        # Counts follow an activity to another project, or type
+        other = ProjectFactory()
+        other.save()
+        boost = Activity.query.filter_by(name='boost').first()
+        boost.update(project_id=other.id)
+        db.session.refresh(project)
+        db.session.refresh(other)
+        assert project.count_boosts == 0
+        assert project.count_activities == 1
+        assert other.count_boosts == 1
+        assert other.last_activity_at == boost.timestamp
+        boost.update(name='star')
+        db.session.refresh(other)
+        assert other.count_boosts == 0
+        assert other.count_stars == 1
+        assert other.count_activities == 1
+
+    def test_project_bulk_data(self, db):
+        """Test batched serialization of projects."""
+        event = EventFactory()
+        owner = UserFactory()
+        members = [UserFactory() for i in range(3)]
+        for i in range(4):
+            project = ProjectFactory(event=event, user=owner)
+            project.save()
+            for user in members[:i]:
+                ProjectActivity(project, 'star', user)
+            ProjectActivity(project, 'star', owner)
+        projects = Project.query.filter_by(event_id=event.id) \
+                                .order_by(Project.id)
+        assert Project.bulk_data(projects) == [p.data for p in projects]
+        assert len(Project.bulk_data(projects)[3]['team']) == 4
+
+    def test_project_rescore(self, db):
+        """Test that bulk scoring matches the per-project score."""
+        event = EventFactory()
+        users = [UserFactory() for i in range(3)]
+        projects = []
+        for i, progress in enumerate([None, -1, 0, 5, 10, 50]):
+            project = ProjectFactory(event=event, progress=progress)
+            project.longtext = 'x' * (i * 120)
+            project.autotext = 'y' * (i * 3)
+            project.save()
+            for user in users[:i % 4]:
+                ProjectActivity(project, 'star', user)
+            if i % 2:
+                ProjectActivity(project, 'boost', users[0])
+            projects.append(project)
+        expected = {}
+        for project in projects:
+            project.update_null_fields()
+            expected[project.id] = project.calculate_score()
+        for project in projects:
+            project.score = -1
+            project.save()
+        assert RescoreEventProjects(event.id) == len(projects)
+        for project in projects:
+            db.session.refresh(project)
+            assert project.score == expected[project.id]
+        assert RescoreEventProjects(event.id) == 0
+
     def test_project_promote(self, db):
         project = ProjectFactory()
         db.session.add(project)
@@ -225,6 +333,63 @@ class TestProject:
         challenge.save()
         assert challenge.versions.count() == 3
 
+    def test_project_stats(self, db):
+        user = UserFactory()
+        event = EventFactory()
+        event.starts_at = dt.datetime.utcnow() - dt.timedelta(days=1)
+        event.ends_at = dt.datetime.utcnow() + dt.timedelta(days=1)
+        project, other = ProjectFactory(), ProjectFactory()
+        project.event = event
+        project.longtext = 'Word.'
+        project.save()
+        other.save()
+        ProjectActivity(project, 'update', user, 'commit')
+        ProjectActivity(project, 'update', user, 'sync')
+        ProjectActivity(project, 'star', user)
+        ProjectActivity(other, 'review', user, 'post')
+        before = project.activities[0]
+        before.timestamp = event.starts_at - dt.timedelta(days=1)
+        before.save()
+        stats = project.get_stats()
+        assert stats == {
+            'total': 3, 'updates': 2, 'commits': 1, 'during': 2,
+            'people': 1, 'sizepitch': 5,
+            'sizetotal': 5 + len(project.summary),
+        }
+        stats = Project.bulk_stats([project, other])
+        assert stats[project.id]['total'] == 3
+        assert stats[other.id]['total'] == 1
+        assert stats[other.id]['during'] == 0
+
+    def test_challenge_snapshots(self, db):
+        event = EventFactory()
+        project = ProjectFactory()
+        project.event = event
+        project.progress = 0
+        project.save()
+        original_name = project.name
+        project.name = u'Updated name'
+        stageProjectToNext(project)
+        project.save()
+        snapshots = Project.challenge_snapshots(event.id)
+        assert snapshots[project.id]['name'] == original_name
+        assert snapshots[project.id]['progress'] <= 0
+        # The live project is left as it was
+        assert project.name == u'Updated name'
+        assert not project.is_challenge
+        assert cache.get(challenges_key(event.id)) == snapshots
+        project.summary = u'Changed'
+        db.session.flush()
+        # Kept until the change is committed
+        assert cache.get(challenges_key(event.id)) == snapshots
+        project.save()
+        assert cache.get(challenges_key(event.id)) is None
+        # Projects missing from the cache are added to it
+        cache.set(challenges_key(event.id), {})
+        snapshots = Project.challenge_snapshots(event.id, [project])
+        assert cache.get(challenges_key(event.id)) == snapshots
+        assert project.id in snapshots
+
     def test_project_from_data(self):
         project = ProjectFactory()
         event = EventFactory()
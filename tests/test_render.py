@@ -2,14 +2,24 @@
 """Dribdat data rendering tests."""
 
 from dribdat.boxout.datapackage import box_datapackage
+from dribdat.boxout.dribdat import box_project
+from requests.models import Response
 from dribdat.boxout.ckan import box_dataset
 from dribdat.apipackage import (
     event_to_data_package,
     load_file_datapackage,
     fetch_datapackage
 )
-from .factories import UserFactory, EventFactory
+from dribdat.htmlcache import cached_filter
+from dribdat.onebox import OneboxEngine
+from micawber.providers import ProviderRegistry
+from flask import url_for
+from .factories import UserFactory, EventFactory, ProjectFactory
+from dribdat.database import db
+from cachelib import SimpleCache
+from markupsafe import Markup
 import pytest
+import time
 
 
 @pytest.mark.usefixtures('db')
@@ -66,3 +76,136 @@ class TestRender:
         dpkg_html = box_dataset(self.TEST_CKAN)
         assert dpkg_html is not None
         assert "boxout" in dpkg_html
+
+    def test_render_cache(self, app, monkeypatch):
+        """Cache the output of text filters."""
+        monkeypatch.setattr('dribdat.htmlcache.cache', SimpleCache())
+        calls = []
+
+        def render(text):
+            calls.append(text)
+            return Markup('<p>%s</p>' % text)
+        cached = cached_filter('test', render)
+        assert cached('Hello') == Markup('<p>Hello</p>')
+        html = cached('Hello')
+        assert isinstance(html, Markup)
+        assert html == '<p>Hello</p>'
+        assert calls == ['Hello']
+        # Any change of the source is rendered again
+        cached('Hello!')
+        assert calls == ['Hello', 'Hello!']
+        # The application filters are wrapped
+        md = app.jinja_env.filters['markdown']
+        assert md('*Hi*') == md('*Hi*') == Markup('<p><em>Hi</em></p>\n')
+
+    def test_oembed_parallel(self, app, monkeypatch):
+        """Resolve the embeds of a document concurrently."""
+        monkeypatch.setattr('dribdat.onebox.cache', SimpleCache())
+        monkeypatch.setattr('dribdat.onebox.OEMBED_BUDGET', 0.5)
+        requested = []
+
+        class Providers:
+            def provider_for_url(self, url):
+                return None if 'unknown' in url else url
+
+            def request(self, url, **params):
+                requested.append(url)
+                if 'slow' in url:
+                    time.sleep(2)
+                if 'broken' in url:
+                    raise Exception("Not found")
+                time.sleep(0.2)
+                return {'type': 'link', 'url': url, 'title': 'Video'}
+        text = '\n'.join([
+            'Intro', 'https://video.example/1', 'https://video.example/2',
+            'https://video.example/3', 'https://slow.example/4',
+            'https://broken.example/5', 'https://unknown.example/6',
+        ])
+        started = time.monotonic()
+        lines = OneboxEngine(Providers()).render(text).splitlines()
+        # Waits for the budget, not for the sum of the requests
+        assert time.monotonic() - started < 1.5
+        assert lines[0] == 'Intro'
+        assert all('<a href=' in line for line in lines[1:4])
+        # Timeouts and failures fall back to the plain links
+        assert lines[4:] == text.splitlines()[4:]
+        assert 'https://unknown.example/6' not in requested
+        # Boxes are kept, and failures are not tried again
+        requested.clear()
+        lines = OneboxEngine(Providers()).render(text).splitlines()
+        assert all('<a href=' in line for line in lines[1:4])
+        assert requested == ['https://slow.example/4']
+
+    def test_onebox_engine(self, app):
+        """Box a whole document in one pass."""
+        project = ProjectFactory(name='Boxed project')
+        project.save()
+        text = '\r\n'.join([
+            '# Pitch', '',
+            '%sproject/%d' % (url_for('public.home', _external=True),
+                              project.id),
+            'See https://example.com/page for details',
+            '  https://example.com/video  ',
+            'https://opendata.swiss/de/dataset/some-data',
+            'Last line',
+        ])
+        engine = OneboxEngine(ProviderRegistry())
+        html = engine.render(text)
+        assert 'Boxed project' in html
+        assert 'ckan-embed' in html.splitlines()[0]
+        # Other lines are kept as they are
+        assert '\n# Pitch\n\n' in html
+        assert '\nSee https://example.com/page for details\n' \
+            '  https://example.com/video  \n' in html
+        assert html.endswith('\nLast line')
+        assert '\r' not in html
+        # Links to this server follow the address of the request
+        with app.test_request_context(base_url='https://other.example/'):
+            html = engine.render(text)
+        assert 'Boxed project' not in html
+
+    def test_preview_cache(self, app, monkeypatch):
+        """Keep previews until the project or package changes."""
+        cache = SimpleCache()
+        project = ProjectFactory(name='Before')
+        project.save()
+        url = 'http://localhost/project/%d' % project.id
+        assert 'Before' in box_project(url, cache)
+        monkeypatch.setattr('dribdat.user.models.cache', cache)
+        project.name = 'After'
+        db.session.flush()
+        # Removed only once the change is committed
+        assert 'Before' in box_project(url, cache)
+        project.save()
+        assert 'After' in box_project(url, cache)
+        # Which pages show as soon as the change is committed
+        monkeypatch.setattr('dribdat.onebox.cache', cache)
+        onebox = app.jinja_env.filters['onebox']
+        assert 'After' in onebox(url)
+        project.name = 'Again'
+        project.save()
+        assert 'Again' in onebox(url)
+        # Data Packages are revalidated with their ETag
+        with open(self.FILE_MOCK, 'rb') as fp:
+            package = fp.read()
+        fetches = []
+
+        def fake_get(url, **kwargs):
+            fetches.append(url)
+            response = Response()
+            response.status_code = 200
+            response.headers['ETag'] = '"%d"' % len(package)
+            response._content = package
+            return response
+        monkeypatch.setattr(
+            'dribdat.boxout.datapackage.cached_get', fake_get)
+        line = 'https://example.com/datapackage.json'
+        box = box_datapackage(line, cache)
+        assert 'Awesome hackathon' in box
+        assert box_datapackage(line, cache) == box
+        assert len(fetches) == 1
+        monkeypatch.setattr(
+            'dribdat.boxout.datapackage.PREVIEW_REVALIDATE', 0)
+        package = package.replace(b'Awesome hackathon', b'Great hackathon!')
+        assert 'Great hackathon!' in box_datapackage(line, cache)
+        assert len(fetches) == 2
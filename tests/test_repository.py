@@ -122,3 +122,76 @@ class TestRepository:
         assert test_obj['name'] == 'dribdat'
         assert test_obj['type'] == 'Bitbucket'
         # TODO: support for commits
+
+    def test_conditional_cache(self, tmp_path, monkeypatch):
+        """Test revalidation and eviction of cached fetches."""
+        from requests.models import Response
+        from dribdat import apicache
+        sent = []
+
+        def fake_get(url, headers=None, **kwargs):
+            sent.append(headers)
+            response = Response()
+            response.url = url
+            if headers and headers.get('If-None-Match') == '"v1"':
+                response.status_code = 304
+            else:
+                response.status_code = 200
+                response.headers['ETag'] = '"v1"'
+                response._content = ('{"name": "%s"}' % url).encode('utf-8')
+            return response
+
+        monkeypatch.setattr(apicache.apiclient, 'get', fake_get)
+        monkeypatch.setattr(apicache, 'STATS', dict.fromkeys(apicache.STATS, 0))
+        apicache.configure(str(tmp_path), 300)
+        try:
+            data = apicache.cached_get('http://a.test/1')
+            assert data.json()['name'] == 'http://a.test/1'
+            data = apicache.cached_get('http://a.test/1')
+            assert sent[-1]['If-None-Match'] == '"v1"'
+            assert data.status_code == 200
+            assert data.json()['name'] == 'http://a.test/1'
+            # Bounded in size, least recently used entries go first
+            apicache.cached_get('http://a.test/2')
+            apicache.cached_get('http://a.test/3')
+            stats = apicache.cache_stats()
+            assert stats['size'] <= 300
+            assert stats['evictions'] >= 1
+            assert apicache.load_entry('http://a.test/3') is not None
+            assert stats['hits'] == 1 and stats['misses'] == 3
+        finally:
+            apicache.configure(None)
+
+    def test_client_retries(self):
+        """Test retrying and statistics of the shared client."""
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        from threading import Thread
+        from dribdat import apiclient
+        calls = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                calls.append(self.path)
+                self.send_response(503 if len(calls) < 3 else 200)
+                self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(b'{"name": "ok"}')
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        host = '127.0.0.1:%d' % server.server_port
+        apiclient.configure(retries=3, backoff=0)
+        try:
+            data = apiclient.get('http://%s/repo' % host)
+            assert data.json()['name'] == 'ok'
+            assert len(calls) == 3
+            stats = [s for s in apiclient.host_stats() if s['host'] == host]
+            assert stats[0]['requests'] == 1
+            assert stats[0]['retries'] == 2
+            assert stats[0]['errors'] == 0
+        finally:
+            server.shutdown()
+            apiclient.configure()
@@ -4,12 +4,19 @@
 from dribdat.aggregation import (
     AddProjectDataFromAutotext,
     SyncProjectData,
+    SyncEventProjects,
+    SyncCommitData,
     TrimProjectData, 
     FetchWebProject,
     ProjectActivity,
 )
 from dribdat.utils import fix_relative_links
-from .factories import ProjectFactory
+from .factories import ProjectFactory, EventFactory
+from dribdat.user.models import Activity
+from dribdat.apievents import iter_commits_github
+from datetime import timedelta, timezone
+from requests.models import Response
+import json
 
 from .mock.project_data import project_data
 
@@ -90,3 +97,107 @@ class TestSync:
         assert imgroot in readme
         assert not '(world.png)' in readme
         assert not '"again.jpg"' in readme
+
+    def test_event_sync(self, user, testapp, monkeypatch):
+        """Test concurrent sync of several projects."""
+        remote = {
+            'https://github.com/a/a': {'name': 'a', 'description': 'Fresh'},
+            'https://github.com/a/b': {'name': 'b', 'description': 'Same'},
+            'https://gitlab.com/a/c': {},
+        }
+        monkeypatch.setattr(
+            'dribdat.aggregation.GetProjectData',
+            lambda url, since=None: remote[url])
+        projects = []
+        for url in remote.keys():
+            project = ProjectFactory(autotext_url=url, autotext='Same')
+            project.save()
+            projects.append(project)
+        projects.append(ProjectFactory(autotext_url=''))
+        report = SyncEventProjects(projects, max_workers=2, per_host=1)
+        assert [r['status'] for r in report] == \
+            ['synced', 'unchanged', 'failed']
+        assert projects[0].autotext == 'Fresh'
+        assert report[0]['fetch_time'] >= 0
+
+    def test_commit_sync(self, user, testapp):
+        """Test incremental sync of commits."""
+        event = EventFactory()
+        event.save()
+        project = ProjectFactory(event=event)
+        project.save()
+        start = event.starts_at_tz
+        commits = [{
+            'url': 'https://github.com/a/b/commit/%d' % i,
+            'date': start + timedelta(hours=i),
+            'author': 'someone',
+            'message': 'Commit %d' % i,
+        } for i in range(-1, 4)]
+        assert project.commits_since == start
+        SyncCommitData(project, commits[:3])
+        # The commit before the event is ignored
+        assert project.count_commits == 2
+        assert project.commits_synced_at == \
+            commits[2]['date'].replace(microsecond=0, tzinfo=None)
+        # Fetches overlap with the previous sync, if not before the event
+        assert project.commits_since == start
+        project.commits_synced_at += timedelta(days=2)
+        assert project.commits_since == \
+            commits[2]['date'].replace(microsecond=0) + timedelta(days=1)
+        project.commits_synced_at -= timedelta(days=2)
+        SyncCommitData(project, commits[2:])
+        assert project.count_commits == 4
+        assert Activity.query.filter_by(
+            project_id=project.id, action='commit').count() == 4
+        # Commits are deduplicated by their link, stored in UTC
+        late = dict(commits[3], url=commits[3]['url'] + 'b', date=(
+            commits[3]['date'].astimezone(timezone(timedelta(hours=2)))))
+        SyncCommitData(project, [late, dict(late, message='Same')])
+        assert project.count_commits == 5
+        activity = Activity.query.filter_by(ref_url=late['url']).one()
+        assert activity.timestamp == commits[3]['date'].astimezone(
+            timezone.utc).replace(microsecond=0, tzinfo=None)
+
+    def test_paginated_commits(self, user, testapp, monkeypatch):
+        """Test streaming the commit history across pages."""
+        event = EventFactory()
+        event.save()
+        project = ProjectFactory(event=event)
+        project.save()
+        start = event.starts_at_tz
+        history = [{
+            'html_url': 'https://github.com/a/b/commit/%d' % i,
+            'author': {'login': 'someone'},
+            'commit': {
+                'message': 'Commit %d' % i,
+                'committer': {'name': 'Someone', 'date':
+                    (start + timedelta(hours=i)).isoformat()},
+            },
+        } for i in range(4, -4, -1)]
+        requested = []
+
+        def fake_get(url, **kwargs):
+            # Serve the history in pages of three commits
+            page = int(url.split('?page=')[-1]) if '?page=' in url else 1
+            requested.append(page)
+            response = Response()
+            response.status_code = 200
+            response._content = json.dumps(
+                history[(page - 1) * 3:page * 3]).encode('utf-8')
+            response.headers['Link'] = \
+                '<https://api.github.com/x?page=%d>; rel="next"' % (page + 1)
+            return response
+        monkeypatch.setattr('dribdat.apievents.apiclient.get', fake_get)
+        commits = iter_commits_github('a/b', since=start)
+        # Nothing is fetched until the commits are consumed
+        assert requested == []
+        SyncCommitData(project, commits, batch_size=2)
+        # Reads to the end, ignoring the commits before the event
+        assert requested == [1, 2, 3, 4]
+        # Without a start time, only the latest commits are read
+        requested.clear()
+        assert len(list(iter_commits_github('a/b'))) == 3
+        assert requested == [1]
+        assert project.count_commits == 5
+        assert Activity.query.filter_by(
+            project_id=project.id, action='commit').count() == 5
@@ -5,8 +5,14 @@ See: http://webtest.readthedocs.org/
 """
 from .factories import ProjectFactory, EventFactory, UserFactory
 from dribdat.public import views
+from dribdat import sqlstats
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.exc import DatabaseError
+from flask import g
 from dribdat.aggregation import ProjectActivity
 from datetime import datetime
+import pytest
+import re
 
 class TestViews:
     """Home views."""
@@ -71,3 +77,89 @@ class TestViews:
         # Test personal view
         user_rss = testapp.get('/feeds/user/' + user.username)
         assert 'Hello, world' in user_rss
+
+    def test_dribs_pages(self, event, testapp):
+        """Page through dribs and activity feeds."""
+        user = UserFactory()
+        user.save()
+        project = ProjectFactory()
+        project.event = event
+        project.user = user
+        project.save()
+        for i in range(5):
+            ProjectActivity(project, 'review', user, 'post', 'Drib %d' % i)
+        view_html = testapp.get('/dribs?limit=2')
+        assert 'Drib 4' in view_html and 'Drib 2' not in view_html
+        view_html = view_html.click(linkid='next-dribs')
+        assert 'Drib 2' in view_html and 'Drib 4' not in view_html
+        view_html = view_html.click(linkid='next-dribs')
+        assert 'Drib 0' in view_html and 'next-dribs' not in view_html
+        # The same cursors are used by the API
+        url = '/api/project/activity.json'
+        res = testapp.get(url, {'limit': 2, 'action': 'post'})
+        assert [a['content'] for a in res.json['activities']] == \
+            ['Drib 4', 'Drib 3']
+        res = testapp.get(url, {'limit': 2, 'before_id': res.json['next']})
+        assert [a['content'] for a in res.json['activities']] == \
+            ['Drib 2', 'Drib 1']
+        res = testapp.get(url, {'after_id': res.json['activities'][0]['id']})
+        assert [a['content'] for a in res.json['activities']] == \
+            ['Drib 4', 'Drib 3']
+        res = testapp.get(url, {'user': user.id, 'project': project.id,
+                                'name': 'review'})
+        assert len(res.json['activities']) == 5
+        testapp.get(url, {'name': 'nothing'}, status=400)
+        # Filters are kept from one page to the next
+        for i in range(5, 8):
+            ProjectActivity(project, 'boost', user, 'post', 'Drib %d' % i)
+        view_html = testapp.get('/dribs', {'limit': 2, 'name': 'review'})
+        assert 'Drib 4' in view_html and 'Drib 5' not in view_html
+        view_html = view_html.click(linkid='next-dribs')
+        assert 'Drib 2' in view_html and 'Drib 7' not in view_html
+        view_html = view_html.click(linkid='next-dribs')
+        assert 'Drib 0' in view_html and 'next-dribs' not in view_html
+        view_html = testapp.get('/dribs', {'limit': 2, 'name': 'boost',
+                                           'action': 'post'})
+        assert 'Drib 7' in view_html and 'Drib 4' not in view_html
+        view_html = view_html.click(linkid='next-dribs')
+        assert 'Drib 5' in view_html and 'Drib 4' not in view_html
+        assert 'next-dribs' not in view_html
+        testapp.get('/dribs', {'name': 'nothing'}, status=400)
+
+    def test_sql_stats(self, app, db, event, testapp, caplog):
+        """Count the queries of a request."""
+        app.config['SQL_SLOW_QUERIES'] = 0
+        app.config['SQL_REPEAT_LIMIT'] = 0
+        sqlstats.init_app(app)
+        try:
+            for i in range(3):
+                project = ProjectFactory()
+                project.event = event
+                project.save()
+            res = testapp.get('/event/%d' % event.id)
+            timing = res.headers['Server-Timing']
+            assert timing.startswith('db;dur=') and ' queries"' in timing
+            assert 'Slow request GET /event/%d' % event.id in caplog.text
+            assert 'Possible N+1' in caplog.text
+            # Streamed responses are reported once they have been sent
+            url = '/api/event/%d/projects.csv' % event.id
+            res = testapp.get(url)
+            logged = re.search(r'GET %s: \d+ ms, (\d+) queries' % url,
+                               caplog.text)
+            # Including the queries made while streaming the rows
+            assert int(logged.group(1)) > 1
+            # Failed statements are not counted
+            with app.test_request_context():
+                sqlstats.start_request()
+                with pytest.raises(DatabaseError):
+                    db.session.execute(text('SELECT * FROM nowhere'))
+                db.session.rollback()
+                db.session.execute(text('SELECT 1'))
+                assert g.sqlstats.queries == 1
+        finally:
+            # Leave the engine as other tests expect it
+            for name in ['before_cursor_execute', 'after_cursor_execute']:
+                sa_event.remove(db.engine, name, getattr(sqlstats, name))
+        assert sqlstats.statement_shape(
+            'SELECT a FROM b\n WHERE c IN (?, ?, ?)') == \
+            'SELECT a FROM b WHERE c IN (?)'